@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+"""Benchmarks for config loading and template resolution.
+
+Runs the ConfigReader path functions against synthetic configs of varying template
+depth, nested global tokens and profile counts. Results can be stored as a baseline
+and later runs are compared against it:
+
+    python benchmarks/bench_config.py --save-baseline
+    python benchmarks/bench_config.py
+"""
+
+import os
+import sys
+import gc
+import json
+import shutil
+import argparse
+import tempfile
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_reader
+import path_template
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.2
+
+# (template depth, nested global tokens, profile count)
+SCENARIOS = [
+    (depth, nesting, profiles)
+    for depth in (3, 6, 10)
+    for nesting in (0, 3)
+    for profiles in (5, 50)
+]
+
+
+def scenario_name(depth, nesting, profiles):
+    return "depth%d_nest%d_prof%d" % (depth, nesting, profiles)
+
+def create_config(root, depth, nesting, profiles):
+    """ Writes a synthetic job config and returns a tuple of the job path and a token
+    dictionary that fills in the first profile.
+    """
+    job_path = os.path.join(root, scenario_name(depth, nesting, profiles))
+    os.makedirs(job_path)
+
+    # Each nested global points at the previous one, the last is used by the profiles
+    global_lines = ["  root_0: <job_path>/production"]
+    for index in range(1, nesting + 1):
+        global_lines.append("  root_%d: <root_%d>/level_%d" % (index, index - 1, index))
+    root_token = "<root_%d>" % nesting
+
+    tokens = ["token_%d" % index for index in range(depth)]
+    token_path = "/".join("<%s>" % token for token in tokens)
+    profile_lines = []
+    for index in range(profiles):
+        profile_lines.append("      profile_%d: %s/profile_%d/%s/work" % (
+            index, root_token, index, token_path))
+
+    lines = ["globals:"] + global_lines + [
+        "  name_profiles:",
+        "    profile_0: %s_<ver>" % "_".join("<%s>" % token for token in tokens),
+        "software:",
+        "  bench:",
+        "    extensions: [.ma, .nk]",
+        "    launcher_profiles:",
+    ] + profile_lines
+
+    with open(os.path.join(job_path, config_reader.CONFIG_FILE_NAME), 'w') as stream:
+        stream.write("\n".join(lines) + "\n")
+
+    token_dict = dict((token, "value_%d" % index) for index, token in enumerate(tokens))
+    return job_path, token_dict
+
+def load_parsed(job_path):
+    """ Reads a config from its YAML, like the first time a job is opened. """
+    config_reader.clear_config_readers()
+    try:
+        os.remove(config_reader.get_config_cache_path(
+            os.path.join(job_path, config_reader.CONFIG_FILE_NAME)))
+    except OSError:
+        pass
+    return config_reader.ConfigReader(job_path)
+
+def load_sidecar(job_path):
+    """ Reads a config from its local parsed cache, like a job opened by a new process. """
+    config_reader.clear_config_readers()
+    return config_reader.ConfigReader(job_path)
+
+def build_cases(reader, token_dict):
+    """ Returns a list of (name, function) benchmarks for a reader. """
+    template = reader.get_profile_template('bench', 'profile_0')
+    tokens = reader.get_tokens(template)
+    middle_token = tokens[len(tokens) // 2]
+    expanded = reader.replace_tokens(template, reader.get_globals())
+    path = reader.get_path(template, dict(token_dict))
+    batch = [dict(token_dict) for _ in range(100)]
+
+    return [
+        ('find_tokens', lambda: reader.find_tokens(template)),
+        ('replace_tokens', lambda: reader.replace_tokens(expanded, token_dict)),
+        ('get_path', lambda: reader.get_path(template, dict(token_dict))),
+        ('get_path_token', lambda: reader.get_path(template, dict(token_dict), middle_token)),
+        ('get_paths_x100', lambda: reader.get_paths(template, batch)),
+        ('get_tokens', lambda: reader.get_tokens(template)),
+        ('get_name', lambda: reader.get_name('profile_0', dict(token_dict), 'bench')),
+        ('parse_path', lambda: reader.parse_path(path)),
+    ]
+
+def measure(function, iterations):
+    """ Returns a dictionary of the throughput and memory use of a function. """
+    # Warm up caches so only the steady state is measured
+    function()
+
+    gc.collect()
+    start = timeit.default_timer()
+    for _ in range(iterations):
+        function()
+    elapsed = timeit.default_timer() - start
+
+    result = {
+        'ops_per_sec': iterations / elapsed if elapsed else float('inf'),
+        'usec_per_op': elapsed * 1e6 / iterations,
+    }
+
+    if tracemalloc is not None:
+        sample = max(1, iterations // 10)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for _ in range(sample):
+            function()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        # Blocks still held once the calls return, such as cache entries, tracemalloc
+        # can't count the ones freed in between
+        result['retained_blocks_per_op'] = float(sum(
+            stat.count_diff for stat in stats)) / sample
+        result['peak_bytes'] = peak
+    return result
+
+def run(iterations, name_filter=None):
+    """ Runs every benchmark and returns a dictionary of results keyed by name. """
+    results = dict()
+    root = tempfile.mkdtemp(prefix='pipeline_bench_')
+    # Keep the parsed config cache out of the user's cache dir
+    config_reader.LOCAL_CACHE_DIR = os.path.join(root, 'cache')
+    try:
+        for depth, nesting, profiles in SCENARIOS:
+            scenario = scenario_name(depth, nesting, profiles)
+            job_path, token_dict = create_config(root, depth, nesting, profiles)
+
+            # The config caches would serve every load after the first
+            cases = [('load', lambda: load_parsed(job_path)),
+                     ('load_sidecar', lambda: load_sidecar(job_path))]
+            cases += build_cases(config_reader.ConfigReader(job_path), token_dict)
+            for case, function in cases:
+                name = scenario + "/" + case
+                if name_filter and name_filter not in name:
+                    continue
+                results[name] = measure(function, iterations)
+                print("%-40s %12.1f ops/s %10.2f us/op" % (
+                    name, results[name]['ops_per_sec'], results[name]['usec_per_op']))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def compare(results, baseline, threshold):
+    """ Returns a list of (name, baseline ops, current ops) for every benchmark that
+    slowed down by more than the threshold.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base_ops = baseline[name]['ops_per_sec']
+        if result['ops_per_sec'] < base_ops * (1.0 - threshold):
+            regressions.append((name, base_ops, result['ops_per_sec']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=2000,
+                        help="calls per benchmark")
+    parser.add_argument('-k', '--filter', default=None,
+                        help="only run benchmarks whose name contains this string")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH,
+                        help="path of the stored baseline")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction of throughput that may be lost before failing")
+    parser.add_argument('--output', default=None, help="also write the results to this path")
+    args = parser.parse_args(argv)
+
+    # Templates are compiled once per process, start from an empty cache
+    path_template._TEMPLATE_CACHE.clear()
+    results = run(args.iterations, args.filter)
+
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+        print("Saved baseline to " + args.baseline)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print("No baseline at " + args.baseline + ", run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as stream:
+        baseline = json.load(stream)
+    regressions = compare(results, baseline, args.threshold)
+    for name, base_ops, ops in regressions:
+        print("REGRESSION %s: %.1f -> %.1f ops/s (%.0f%%)" % (
+            name, base_ops, ops, (ops / base_ops - 1.0) * 100))
+    if regressions:
+        return 1
+    print("No regressions against " + args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,9 +3,48 @@
 
 import yaml
 import os
+import sys
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Use libyaml when it's available, it's many times faster than the pure python loader
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+import path_template
 
 JOB_PATH_TOKEN = "job_path"
 from pipeline_config import CONFIG_FILE_NAME
+from pipeline_config import LOCAL_CACHE_DIR
+from pipeline_config import STUDIO_CONFIG_PATH
+
+CONFIG_CACHE_VERSION = 1
+# Key of a config pointing to the config it overrides
+INHERIT_KEY = "inherit"
+
+# Resolved, read-only view of a software block with its overrides merged over globals
+SoftwareConfig = namedtuple(
+    'SoftwareConfig', ['launcher_profiles', 'extensions', 'hooks', 'name_profiles'])
+
+# Shared readers keyed by (job_path, config_path)
+_READER_CACHE = dict()
+_READER_CACHE_LOCK = threading.Lock()
+
+# Parsed layers keyed by path and merged configs keyed by their layers
+_LAYER_CACHE = dict()
+_MERGED_CACHE = dict()
+_LAYER_CACHE_LIMIT = 256
+_MERGED_CACHE_LIMIT = 256
+_LAYER_CACHE_LOCK = threading.Lock()
 
 
 class ConfigReader:
@@ -17,7 +56,40 @@ class ConfigReader:
             self.configPath = os.path.join(self.job_path, CONFIG_FILE_NAME)
         else:
             self.configPath = os.path.join(config_path)
-        self.config = self.read_config(self.configPath)
+        # Each layer is a tuple of (path, signature) used to know when to reload
+        self.config, self.layers = load_config(self.configPath)
+        self.build_views()
+
+    def build_views(self):
+        """ Resolves the globals and every software block once so the accessors are plain 
+        lookups. The views are shared and must be treated as read-only.
+        """
+        config = self.config or {}
+        self._globals = config.get('globals') or {}
+        self._token_defaults = self.merge_dicts(self._globals, {JOB_PATH_TOKEN: self.job_path})
+        self._bound_templates = dict()
+        self._path_index = None
+        self._excludes = config.get('exclude') or {}
+        global_name_profiles = self._globals.get('name_profiles') or {}
+
+        self._default_view = SoftwareConfig(
+            launcher_profiles={}, extensions=[], hooks='', name_profiles=global_name_profiles)
+        self._software_views = dict()
+        for software, software_config in (config.get('software') or {}).items():
+            software_config = software_config or {}
+            name_profiles = self.merge_dicts(
+                global_name_profiles, software_config.get('name_profiles') or {})
+            self._software_views[software] = SoftwareConfig(
+                launcher_profiles=software_config.get('launcher_profiles') or {},
+                extensions=software_config.get('extensions') or [],
+                hooks=software_config.get('hooks') or '',
+                name_profiles=name_profiles)
+
+    def get_software_view(self, software=None):
+        """ Returns the resolved SoftwareConfig for the given software, or one holding only 
+        the globals if the software isn't supported.
+        """
+        return self._software_views.get(software, self._default_view)
 
     def merge_dicts(self, x, y):
         """Merges two dictionarys. Overwrites values of the first dictionary with the second. """
@@ -26,130 +98,96 @@ class ConfigReader:
         return z
 
     def read_config(self, configPath):
-        """Reads the config file and returns a dictionary"""
-        with open(configPath) as stream:
-            try:
-                config = yaml.safe_load(stream)
-            except yaml.YAMLError as exc:
-                print(exc)
-        return config
+        """Reads the config file, merged over the layers it inherits from, and returns a 
+        dictionary
+        """
+        return load_config(configPath)[0]
 
     def replace_tokens(self, templateString, tokenDict):
         """Takes a templateString and attempts to create a path with
          a dictionary of tokens and values
          """
-        templateTokens = self.find_tokens(templateString)
-        formatedTemplateString = templateString
-        for token in templateTokens:
-            if token in tokenDict and tokenDict.get(token):
-                tokenSyntax = "<" + token + ">"
-                # print("trying to replace " 
-                # + token + " of this syntax: " 
-                # + tokenSyntax + " with " + self.tokenList.get(token))
-                # print("first it's this: " + templateString)
-                formatedTemplateString = formatedTemplateString.replace(
-                    tokenSyntax, tokenDict.get(token))
-            else:
-                pass
-                # raise ValueError("Missing token: " + token)
-
-        # If there are still unreplaced tokens in the tokenDict, in the path, recursively replace them
-        remaining_tokens = self.find_tokens(formatedTemplateString)
-
-        # Check if any of the remaining tokens exist in tokenDict and are not empty
-        non_empty_token_dict = {token:value for (token,value) in tokenDict.items() if value}
-        if any(x in remaining_tokens for x in non_empty_token_dict):
-            formatedTemplateString = self.replace_tokens(formatedTemplateString, tokenDict)
-
-        # Fix path separators:
-        pathList = formatedTemplateString.split("/")
-        finalPath = ""
-        for directory in pathList:
-            if pathList.index(directory) == 0:
-                finalPath = directory
-            elif pathList.index(directory) >= 0:
-                finalPath = os.path.join(finalPath, directory)
-
-        return finalPath
+        template = path_template.compile_template(templateString)
+        return path_template.to_path(template.render(tokenDict))
 
     def get_globals(self):
         """ Returns a dictionary of global variables. """
-        try:
-            return self.config['globals']
-        except:
-            return dict()
+        return self._globals
 
     def get_name_profile_template(self, profile, software=None):
         """ Returns the template for a name if it exists in globals or a software override. """
-        name_template = ''
-        if 'name_profiles' in self.get_globals():
-            name_profiles = self.get_globals()['name_profiles']
-            try: 
-                name_template = name_profiles[profile]
-            except:
-                pass
-        if software and 'name_profiles' in self.get_software_config(software):
-            name_profiles = self.get_software_config(software)['name_profiles']
-            try:
-                name_template = name_profiles[profile]
-            except:
-                pass
-        return name_template
+        return self.get_software_view(software).name_profiles.get(profile, '')
 
     def get_name(self, profile, tokenDict, software=None, ver="001"):
         name_template = self.get_name_profile_template(profile, software)
         tokenDict["ver"] = "v"+ver
-        tokenDict = self.merge_dicts(self.get_globals(), tokenDict)
-        name = self.replace_tokens(name_template, tokenDict)
+        template = path_template.compile_template(name_template)
+        name = path_template.to_path(template.render(tokenDict, self._globals))
         return name
 
+    def bind_template(self, templateString):
+        """ Returns the compiled template with the globals and job path already expanded. 
+        The result is cached for the life of the reader.
+        """
+        bound = self._bound_templates.get(templateString)
+        if bound is None:
+            bound = path_template.compile_template(
+                self.replace_tokens(templateString, self._token_defaults))
+            self._bound_templates[templateString] = bound
+        return bound
+
     def get_path(self, templateString, tokenDict, destinationToken=None):
         """Attempts to return the path to an optional destinationToken from the template 
         and a dictionary of tokens
         """
         tokenDict['job_path'] = self.job_path
+        return self.get_paths(templateString, [tokenDict], destinationToken)[0]
 
-        tokenDict = self.merge_dicts(self.get_globals(), tokenDict)
-
-        templateString = self.replace_tokens(templateString, self.get_globals())
+    def get_paths(self, templateString, tokenDicts, destinationToken=None):
+        """Returns a list of paths, one for each dictionary of tokens. The template is 
+        expanded and compiled once for the whole batch.
+        """
+        template = self.bind_template(templateString)
 
-        if (destinationToken != None):
-            destinationToken = "<" + destinationToken + ">"
-            tokenIndex = templateString.find(destinationToken)
-            templateString = templateString[:tokenIndex]
+        if destinationToken is not None:
+            template = template.prefix(destinationToken) or template
 
-        templateString = self.replace_tokens(templateString, tokenDict)
+        render = template.render
+        defaults = self._token_defaults
+        to_path = path_template.to_path
+        return [to_path(render(tokenDict, defaults)) for tokenDict in tokenDicts]
 
-        return templateString
+    def parse_path(self, path, software=None):
+        """Returns a tuple of (software, profile, tokenDict) for the launcher profile that 
+        the given path belongs to, or None if it doesn't match any of them. Optionally only 
+        the profiles of the given software are considered.
+        """
+        if self._path_index is None:
+            path_index = path_template.PathIndex()
+            for view_software, view in self._software_views.items():
+                for profile, templateString in view.launcher_profiles.items():
+                    path_index.add(
+                        self.bind_template(templateString), (view_software, profile))
+            self._path_index = path_index
+
+        accept = None
+        if software is not None:
+            accept = lambda value: value[0] == software
+        match = self._path_index.match(path, accept)
+        if match is None:
+            return None
+        (software, profile), tokenDict, _ = match
+        return software, profile, tokenDict
 
     def get_tokens(self, templateString):
         """Returns a list of tokens in the given template minus the job path which is defined 
         when configReader is created, and global tokens.
         """
-        # First, expand the template string with all the globals
-        templateString = self.replace_tokens(templateString, self.get_globals())
-        tokens = self.find_tokens(templateString)
-        if JOB_PATH_TOKEN in tokens:
-            tokens.remove(JOB_PATH_TOKEN)
-        return tokens
+        return list(self.bind_template(templateString).tokens)
 
     def find_tokens(self, templateString):
         """Finds tokens in a template and returns them in a list"""
-        i = 0
-        tokenList = list()
-        while (i >= 0):
-            i = templateString.find('<', i, len(templateString))
-            if (i >= 0) : 
-                start = i+1
-                i = templateString.find('>', i, len(templateString))
-                if (i > 0):
-                    end = i
-                    tokenList.append(templateString[start:end])
-                else:
-                    break
-            else: 
-                break
-        return tokenList
+        return path_template.find_tokens(templateString)
 
     def get_software_config(self, software):
         """ Returns the config dictionary for the given software. """
@@ -163,37 +201,22 @@ class ConfigReader:
         return softwareConfig
 
     def check_software_support(self, software):
-        if 'software' in self.config.keys() and software in self.config['software']:
-            return True
-        return False
+        return software in self._software_views
+
+    def get_software_list(self):
+        """ Returns a sorted list of the software the config supports. """
+        return sorted(self._software_views)
 
     def get_launcher_profiles(self, software):
         """Return a list of profiles for current software"""
-        launcher_profiles = dict()
-
-        try: 
-            launcher_profiles = self.get_software_config(software)['launcher_profiles']
-        except:
-            print("launcher_profiles not found in project config")
-
-        return launcher_profiles
+        return self.get_software_view(software).launcher_profiles
 
     def get_extensions(self, software):
         """ Returns a list of extensions associated with the given software. """
-        extensions = []
-        try: 
-            extensions = self.get_software_config(software)['extensions']
-        except:
-            print("No extensions found in project config!")
-
-        return extensions
+        return self.get_software_view(software).extensions
 
     def get_hooks_path(self, software):
-        try: 
-            hook_path = self.get_software_config(software)['hooks']
-            return hook_path
-        except:
-            return ''
+        return self.get_software_view(software).hooks
 
     def get_profile_template(self, software, profile):
         profileTemplate = self.get_launcher_profiles(software)[profile]
@@ -201,11 +224,7 @@ class ConfigReader:
 
     def get_excludes(self, token):
         """Return a list of all excludes associated with the given token"""
-        excludes = []
-        if 'exclude' in self.config.keys():
-            if token in self.config['exclude'].keys():
-                excludes = self.config['exclude'][token]
-        return excludes
+        return self._excludes.get(token) or []
 
     def get_template_directory(self):
         # TODO Error handling non-existant "template_directory"
@@ -216,6 +235,216 @@ class ConfigReader:
         """ Returns the full path to the configuration file. """
         return self.configPath
 
+def load_yaml(stream):
+    """ Parses yaml from a stream or string with the fastest available safe loader. """
+    return yaml.load(stream, Loader=YamlLoader)
+
+def get_file_signature(path):
+    """ Returns a tuple that changes whenever the file is modified. """
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+def read_config_file(configPath):
+    """Reads a single config file and returns a tuple of its signature and dictionary. A 
+    parsed copy is kept in the local cache and used for as long as the file is unchanged.
+    """
+    stat = os.stat(configPath)
+    signature = (stat.st_mtime, stat.st_size)
+    config = read_config_cache(configPath, stat)
+    if config is not None:
+        return signature, config
+
+    config = None
+    with open(configPath) as stream:
+        try:
+            config = load_yaml(stream)
+        except yaml.YAMLError as exc:
+            print(exc)
+    if config is not None:
+        write_config_cache(configPath, stat, config)
+    return signature, config
+
+def read_config_layer(configPath):
+    """ Returns the signature and dictionary of a config layer. Layers are parsed once per 
+    process and shared by every job that inherits from them.
+    """
+    configPath = os.path.abspath(configPath)
+    signature = get_file_signature(configPath)
+    with _LAYER_CACHE_LOCK:
+        cached = _LAYER_CACHE.get(configPath)
+    if cached is not None and cached[0] == signature:
+        return cached
+
+    cached = read_config_file(configPath)
+    with _LAYER_CACHE_LOCK:
+        if len(_LAYER_CACHE) >= _LAYER_CACHE_LIMIT:
+            _LAYER_CACHE.clear()
+        _LAYER_CACHE[configPath] = cached
+    return cached
+
+def merge_configs(base, override):
+    """ Returns a new dictionary of base with override merged over it. Nested dictionaries 
+    are merged, everything else is replaced.
+    """
+    merged = base.copy()
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = merge_configs(merged[key], value)
+        merged[key] = value
+    return merged
+
+def load_config(configPath):
+    """Returns a tuple of the config resolved over its layers and the list of layers as 
+    (path, signature) tuples. The studio config is the base layer, followed by the chain of 
+    configs named by each layer's "inherit" key, and finally the given config.
+    """
+    layers = []
+    configs = []
+    path = os.path.abspath(configPath)
+    while path:
+        if path in (layer[0] for layer in layers):
+            raise ValueError("Config inherits from itself: " + path)
+        signature, config = read_config_layer(path)
+        config = config or {}
+        layers.insert(0, (path, signature))
+        configs.insert(0, config)
+        parent = config.get(INHERIT_KEY)
+        if parent:
+            parent = os.path.join(os.path.dirname(path), os.path.expanduser(parent))
+            path = os.path.abspath(parent)
+        else:
+            path = None
+
+    if STUDIO_CONFIG_PATH and os.path.isfile(STUDIO_CONFIG_PATH):
+        studio_path = os.path.abspath(STUDIO_CONFIG_PATH)
+        if studio_path not in (layer[0] for layer in layers):
+            signature, config = read_config_layer(studio_path)
+            layers.insert(0, (studio_path, signature))
+            configs.insert(0, config or {})
+
+    if len(configs) == 1:
+        return configs[0], layers
+
+    key = tuple(layers)
+    with _LAYER_CACHE_LOCK:
+        merged = _MERGED_CACHE.get(key)
+    if merged is None:
+        merged = configs[0]
+        for config in configs[1:]:
+            merged = merge_configs(merged, config)
+        merged.pop(INHERIT_KEY, None)
+        with _LAYER_CACHE_LOCK:
+            if len(_MERGED_CACHE) >= _MERGED_CACHE_LIMIT:
+                _MERGED_CACHE.clear()
+            _MERGED_CACHE[key] = merged
+    return merged, layers
+
+def get_local_cache_path(kind, path, extension=".pickle"):
+    """ Returns the path of a file in the local cache dir that holds data of the given kind 
+    about path. 
+    """
+    key = os.path.normcase(os.path.abspath(path))
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+    name = hashlib.sha1(key).hexdigest()
+    return os.path.join(
+        LOCAL_CACHE_DIR, "%s_%s_py%d%s" % (kind, name, sys.version_info[0], extension))
+
+def read_local_cache(cachePath):
+    """ Returns the data stored in a local cache file, or None if it can't be read. """
+    try:
+        with open(cachePath, 'rb') as stream:
+            return pickle.load(stream)
+    except Exception:
+        return None
+
+def write_local_cache(cachePath, data):
+    """ Stores data in a local cache file. The file is replaced in one go so readers never 
+    see a partial file. Failures are ignored. 
+    """
+    tempPath = None
+    try:
+        if not os.path.isdir(LOCAL_CACHE_DIR):
+            os.makedirs(LOCAL_CACHE_DIR)
+        # A name of its own, threads of one process can write the same cache at once
+        handle, tempPath = tempfile.mkstemp(".tmp", dir=os.path.dirname(cachePath))
+        with os.fdopen(handle, 'wb') as stream:
+            pickle.dump(data, stream, pickle.HIGHEST_PROTOCOL)
+        # Windows can't rename over an existing file
+        if os.path.exists(cachePath):
+            os.remove(cachePath)
+        os.rename(tempPath, cachePath)
+    except (EnvironmentError, pickle.PicklingError):
+        if tempPath is None:
+            return
+        try:
+            os.remove(tempPath)
+        except EnvironmentError:
+            pass
+
+def get_config_cache_path(configPath):
+    """ Returns the path of the local parsed cache for the given config file. """
+    return get_local_cache_path("config", configPath)
+
+def read_config_cache(configPath, stat):
+    """ Returns the cached config for the given file if it matches the file's stat, 
+    otherwise None.
+    """
+    cache = read_local_cache(get_config_cache_path(configPath))
+    if (not isinstance(cache, dict)
+            or cache.get('version') != CONFIG_CACHE_VERSION
+            or cache.get('path') != os.path.abspath(configPath)
+            or cache.get('mtime') != stat.st_mtime
+            or cache.get('size') != stat.st_size):
+        return None
+    return cache.get('config')
+
+def write_config_cache(configPath, stat, config):
+    """ Stores a parsed config in the local cache. Failures are ignored. """
+    write_local_cache(get_config_cache_path(configPath), {
+        'version': CONFIG_CACHE_VERSION,
+        'path': os.path.abspath(configPath),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'config': config,
+    })
+
+def get_config_reader(job_path, config_path=None):
+    """ Returns a ConfigReader shared by the whole process for the given job. The config 
+    is only read again when one of its layers' modification time or size changes. 
+    """
+    if config_path is None:
+        config_path = os.path.join(job_path, CONFIG_FILE_NAME)
+    key = (job_path, os.path.abspath(config_path))
+
+    with _READER_CACHE_LOCK:
+        reader = _READER_CACHE.get(key)
+    if reader is not None and is_reader_current(reader):
+        return reader
+
+    reader = ConfigReader(job_path, config_path)
+    with _READER_CACHE_LOCK:
+        _READER_CACHE[key] = reader
+    return reader
+
+def is_reader_current(reader):
+    """ Returns true if none of the reader's config layers changed since it was read. """
+    try:
+        for path, signature in reader.layers:
+            if get_file_signature(path) != signature:
+                return False
+    except OSError:
+        return False
+    return True
+
+def clear_config_readers():
+    """ Forgets every shared ConfigReader and config layer. """
+    with _READER_CACHE_LOCK:
+        _READER_CACHE.clear()
+    with _LAYER_CACHE_LOCK:
+        _LAYER_CACHE.clear()
+        _MERGED_CACHE.clear()
+
 # DEBUG -----------------------------------------------------------------------------------------
 
 if __name__== '__main__':
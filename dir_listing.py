@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from collections import namedtuple
+from collections import OrderedDict
+
+# os.scandir returns the type of each entry with the listing, and on Windows its stat too,
+# so one directory read replaces an isdir and getmtime call per entry.
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+DirEntry = namedtuple('DirEntry', ['name', 'path', 'is_dir', 'mtime'])
+
+# Bounds of the shared listing cache, in directories and in total entries
+LISTING_CACHE_DIRS = 1024
+LISTING_CACHE_ENTRIES = 200000
+# Seconds a listing is trusted before the directory's mtime is checked again
+LISTING_CACHE_TTL = 5.0
+
+_LISTING_CACHE = None
+_LISTING_CACHE_LOCK = threading.Lock()
+
+
+def list_dir(path, dirs=True, files=True, extensions=None, with_mtime=False):
+    """Returns a list of DirEntry for the given path. Directories and files can be left out,
+    and if extensions are given only files ending in them are listed. mtime is None unless
+    with_mtime is set. Raises OSError if the path can't be listed.
+    """
+    extensions = tuple(extensions or ())
+    if scandir is None:
+        return _list_dir_slow(path, dirs, files, extensions, with_mtime)
+
+    entries = []
+    for entry in scandir(path):
+        name = entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if is_dir:
+            if not dirs:
+                continue
+        elif not files or (extensions and not name.lower().endswith(extensions)):
+            continue
+
+        mtime = None
+        if with_mtime:
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                # Broken links can't be stat'd
+                continue
+        entries.append(DirEntry(name, entry.path, is_dir, mtime))
+    return entries
+
+def _list_dir_slow(path, dirs, files, extensions, with_mtime):
+    """ list_dir for Pythons without scandir. """
+    entries = []
+    for name in os.listdir(path):
+        entry_path = os.path.join(path, name)
+        is_dir = os.path.isdir(entry_path)
+        if is_dir:
+            if not dirs:
+                continue
+        elif not files or (extensions and not name.lower().endswith(extensions)):
+            continue
+
+        mtime = None
+        if with_mtime:
+            try:
+                mtime = os.path.getmtime(entry_path)
+            except OSError:
+                continue
+        entries.append(DirEntry(name, entry_path, is_dir, mtime))
+    return entries
+
+def filter_entries(entries, dirs=True, files=True, extensions=None):
+    """ Returns the entries matching the same filters as list_dir. """
+    extensions = tuple(extensions or ())
+    if dirs and files and not extensions:
+        return list(entries)
+    return [entry for entry in entries
+            if (dirs if entry.is_dir else
+                files and (not extensions or entry.name.lower().endswith(extensions)))]
+
+def get_listing_cache():
+    """ Returns the listing cache shared by the whole process. """
+    global _LISTING_CACHE
+    with _LISTING_CACHE_LOCK:
+        if _LISTING_CACHE is None:
+            _LISTING_CACHE = ListingCache()
+        return _LISTING_CACHE
+
+def cached_list_dir(path, dirs=True, files=True, extensions=None, with_mtime=False):
+    """ list_dir through the shared listing cache. """
+    return get_listing_cache().list_dir(path, dirs, files, extensions, with_mtime)
+
+def invalidate(path=None):
+    """ Drops the cached listing of path, or every listing if no path is given. """
+    get_listing_cache().invalidate(path)
+
+def list_dir_names(path, dirs=True, files=True, extensions=None, reverse=False):
+    """ Returns a sorted list of entry names for the given path, or an empty list if it
+    can't be listed.
+    """
+    try:
+        entries = cached_list_dir(path, dirs, files, extensions)
+    except OSError:
+        return []
+    return sorted((entry.name for entry in entries), reverse=reverse)
+
+
+class ListingCache(object):
+    """LRU cache of full directory listings.
+
+    Listings are invalidated by inotify where it's available. Otherwise, and for changes
+    inotify can't see such as ones made by other machines on a network share, a listing
+    is trusted for ttl seconds and then kept only while the directory's mtime is unchanged.
+    """
+
+    def __init__(self, max_dirs=LISTING_CACHE_DIRS, max_entries=LISTING_CACHE_ENTRIES,
+                 ttl=LISTING_CACHE_TTL, use_inotify=True):
+        self.max_dirs = max_dirs
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        # path -> (listing, dir mtime, time checked, has mtimes)
+        self.cache = OrderedDict()
+        self.entry_count = 0
+        # Incremented on every invalidation so listings racing with one aren't trusted
+        self.generation = 0
+        # path -> Event set once the thread listing it is done
+        self.listing = dict()
+        self.watcher = None
+        if use_inotify and InotifyWatcher.is_supported():
+            try:
+                self.watcher = InotifyWatcher(self.invalidate)
+            except OSError:
+                self.watcher = None
+
+    def list_dir(self, path, dirs=True, files=True, extensions=None, with_mtime=False):
+        """ Returns the same as list_dir, from the cache when it's still valid. """
+        return filter_entries(self.get(path, with_mtime), dirs, files, extensions)
+
+    def get(self, path, with_mtime=False):
+        """ Returns the full cached listing of path. The list is shared, don't modify it. """
+        path = os.path.normpath(path)
+        while True:
+            now = time.time()
+            with self.lock:
+                cached = self.cache.get(path)
+                if cached is not None and (cached[3] or not with_mtime):
+                    # Move to the most recently used end
+                    self.cache[path] = self.cache.pop(path)
+                    if now - cached[2] < self.ttl:
+                        return cached[0]
+                else:
+                    cached = None
+                generation = self.generation
+
+            if cached is not None:
+                try:
+                    dir_mtime = os.stat(path).st_mtime
+                except OSError:
+                    self.invalidate(path)
+                    raise
+                if dir_mtime == cached[1]:
+                    with self.lock:
+                        if path in self.cache and self.generation == generation:
+                            self.cache[path] = (cached[0], cached[1], now, cached[3])
+                    return cached[0]
+
+            with self.lock:
+                event = self.listing.get(path)
+                if event is None:
+                    event = self.listing[path] = threading.Event()
+                    generation = self.generation
+                    break
+            # Another thread is listing the folder, such as a prefetch, use its listing
+            event.wait()
+
+        try:
+            # Stat before listing so a change during the listing isn't missed
+            dir_mtime = os.stat(path).st_mtime
+            listing = list_dir(path, with_mtime=with_mtime)
+            with self.lock:
+                # Something changed while listing, make the next call check the mtime
+                checked = now if self.generation == generation else 0
+                self.discard(path)
+                self.cache[path] = (listing, dir_mtime, checked, with_mtime)
+                self.entry_count += len(listing)
+                # Watched while cached, so a watch never outlives its listing
+                if self.watcher is not None:
+                    self.watcher.watch(path)
+                self.evict()
+        finally:
+            with self.lock:
+                del self.listing[path]
+            event.set()
+        return listing
+
+    def invalidate(self, path=None):
+        """ Drops the listing of path, or every listing if path is None. """
+        with self.lock:
+            self.generation += 1
+            if path is None:
+                if self.watcher is not None:
+                    for cached_path in self.cache:
+                        self.watcher.unwatch(cached_path)
+                self.cache.clear()
+                self.entry_count = 0
+            else:
+                self.remove(os.path.normpath(path))
+
+    def remove(self, path):
+        """ Drops the listing of path and stops watching it. """
+        self.discard(path)
+        if self.watcher is not None:
+            self.watcher.unwatch(path)
+
+    def discard(self, path):
+        cached = self.cache.pop(path, None)
+        if cached is not None:
+            self.entry_count -= len(cached[0])
+
+    def evict(self):
+        """ Removes the least recently used listings until the cache fits its bounds. """
+        while self.cache and (len(self.cache) > self.max_dirs
+                              or self.entry_count > self.max_entries):
+            path, cached = self.cache.popitem(last=False)
+            self.entry_count -= len(cached[0])
+            if self.watcher is not None:
+                self.watcher.unwatch(path)
+
+
+class InotifyWatcher(object):
+    """Watches directories with Linux inotify and calls callback(path) when one of them
+    changes, or callback(None) if events were lost.
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_CLOEXEC = 0x00080000
+
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct('iIII')
+
+    _libc = None
+
+    @classmethod
+    def is_supported(cls):
+        if not sys.platform.startswith('linux'):
+            return False
+        if cls._libc is None:
+            try:
+                import ctypes
+                import ctypes.util
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1
+                libc.inotify_add_watch
+                libc.inotify_rm_watch
+            except (ImportError, OSError, AttributeError):
+                cls._libc = False
+            else:
+                cls._libc = libc
+        return bool(cls._libc)
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.paths = dict()
+        self.descriptors = dict()
+        self.fd = self._libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self._errno(), "inotify_init1 failed")
+        thread = threading.Thread(target=self.read_events, name="InotifyWatcher")
+        thread.daemon = True
+        thread.start()
+
+    def _errno(self):
+        import ctypes
+        return ctypes.get_errno()
+
+    def watch(self, path):
+        """ Starts watching path. Returns false if it can't be watched. """
+        with self.lock:
+            if path in self.descriptors:
+                return True
+            encoded = path
+            if not isinstance(encoded, bytes):
+                encoded = encoded.encode(sys.getfilesystemencoding() or 'utf-8')
+            wd = self._libc.inotify_add_watch(self.fd, encoded, self.WATCH_MASK)
+            # Out of watches or not a local directory, the mtime check still applies
+            if wd < 0:
+                return False
+            self.descriptors[path] = wd
+            self.paths[wd] = path
+            return True
+
+    def unwatch(self, path):
+        with self.lock:
+            wd = self.descriptors.pop(path, None)
+            if wd is not None:
+                self.paths.pop(wd, None)
+                self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        header_size = self.EVENT_HEADER.size
+        while True:
+            try:
+                select.select([self.fd], [], [])
+                data = os.read(self.fd, 65536)
+            except (OSError, select.error) as exc:
+                if exc.args and exc.args[0] == errno.EINTR:
+                    continue
+                return
+            offset = 0
+            while offset + header_size <= len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += header_size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    self.callback(None)
+                    continue
+                with self.lock:
+                    path = self.paths.get(wd)
+                    if mask & self.IN_IGNORED and path is not None:
+                        del self.paths[wd]
+                        self.descriptors.pop(path, None)
+                if path is not None:
+                    self.callback(path)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import threading
+
+try:
+    # < Nuke 11
+    import PySide.QtCore as QtCore
+except:
+    # >= Nuke 11
+    import PySide2.QtCore as QtCore
+
+import dir_listing
+import job_index
+
+MAX_SCAN_THREADS = 4
+# Thread pool priority of prefetches, real scans go first
+PREFETCH_PRIORITY = -1
+
+
+def scan_directories(path):
+    """ Yields the sorted list of directories in the given path. """
+    yield dir_listing.list_dir_names(path, files=False)
+
+def scan_jobs(jobs_dir, config_file_name):
+    """ Yields the sorted list of jobs in jobs_dir once its job index is refreshed. """
+    yield job_index.get_jobs(jobs_dir, config_file_name)
+
+def prefetch_directories(paths, with_mtime=False):
+    """ Lists each path into the shared listing cache, yielding nothing after each one so
+    the prefetch can be cancelled between folders.
+    """
+    for path in paths:
+        try:
+            dir_listing.cached_list_dir(path, with_mtime=with_mtime)
+        except OSError:
+            pass
+        yield None
+
+def prefetch_recents(recents):
+    """ Lists the folders stored with each recent selection into the shared listing cache,
+    the last one is the file folder. Recents saved without folders are skipped.
+    """
+    for recent in recents:
+        paths = recent.get('paths')
+        if not paths:
+            continue
+        for chunk in prefetch_directories(paths[:-1]):
+            yield chunk
+        for chunk in prefetch_directories(paths[-1:], with_mtime=True):
+            yield chunk
+
+def scan_file_entries(path, extensions=None):
+    """ Yields the list of DirEntry, with mtimes, for the given path. If extensions are given
+    only files ending in them are listed.
+    """
+    try:
+        yield dir_listing.cached_list_dir(path, extensions=extensions, with_mtime=True)
+    except OSError:
+        return
+
+
+class ScanSignals(QtCore.QObject):
+    """ Carries results from the worker threads back to the GUI thread. """
+    chunk = QtCore.Signal(object, int, object)
+    # With the exception the scan raised, or None
+    finished = QtCore.Signal(object, int, object)
+
+
+class ScanTask(QtCore.QRunnable):
+    """ Runs a scan generator on the thread pool and emits every chunk it yields. """
+
+    def __init__(self, signals, channel, generation, cancelled, function, args):
+        super(ScanTask, self).__init__()
+        self.signals = signals
+        self.channel = channel
+        self.generation = generation
+        self.cancelled = cancelled
+        self.function = function
+        self.args = args
+
+    def run(self):
+        # Cancelled while it was queued
+        if self.cancelled.is_set():
+            return
+        error = None
+        try:
+            for chunk in self.function(*self.args):
+                if self.cancelled.is_set():
+                    return
+                self.signals.chunk.emit(self.channel, self.generation, chunk)
+        except Exception as exc:
+            error = exc
+        if not self.cancelled.is_set():
+            self.signals.finished.emit(self.channel, self.generation, error)
+
+
+class DirScanner(QtCore.QObject):
+    """Runs directory scans on a thread pool and delivers the results on the GUI thread.
+
+    Every scan belongs to a channel, a tuple whose first item is its group. Starting a scan
+    cancels the previous scan on the same channel, and results of cancelled scans are
+    never delivered.
+
+    failed is emitted with the channel and the exception of every scan that raises.
+    """
+    failed = QtCore.Signal(object, object)
+
+    def __init__(self, parent=None, max_threads=MAX_SCAN_THREADS):
+        super(DirScanner, self).__init__(parent)
+        self.pool = QtCore.QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        # Not parented so it outlives this object while workers are still running
+        self.signals = ScanSignals()
+        self.signals.chunk.connect(self.on_chunk)
+        self.signals.finished.connect(self.on_finished)
+        self.generation = 0
+        # channel -> (generation, cancelled event, on_chunk, on_done, on_error)
+        self.active = dict()
+
+    def scan(self, channel, function, args=(), on_chunk=None, on_done=None, on_error=None,
+             priority=0):
+        """ Starts function(*args) in the background. on_chunk is called with everything
+        it yields and on_done once it's finished. If it raises, on_error is called with the
+        exception before on_done. Queued scans with a higher priority run first.
+        """
+        self.cancel(channel)
+        self.generation += 1
+        cancelled = threading.Event()
+        self.active[channel] = (self.generation, cancelled, on_chunk, on_done, on_error)
+        self.pool.start(ScanTask(
+            self.signals, channel, self.generation, cancelled, function, args), priority)
+
+    def cancel(self, channel):
+        """ Cancels the scan running on the given channel. """
+        active = self.active.pop(channel, None)
+        if active is not None:
+            active[1].set()
+
+    def cancel_group(self, group):
+        """ Cancels the scans of every channel in the given group. """
+        for channel in list(self.active):
+            if channel[0] == group:
+                self.cancel(channel)
+
+    def cancel_all(self):
+        for channel in list(self.active):
+            self.cancel(channel)
+
+    def is_scanning(self, channel):
+        return channel in self.active
+
+    @QtCore.Slot(object, int, object)
+    def on_chunk(self, channel, generation, chunk):
+        active = self.active.get(channel)
+        # Drop results of cancelled or replaced scans
+        if active is None or active[0] != generation:
+            return
+        if active[2] is not None:
+            active[2](chunk)
+
+    @QtCore.Slot(object, int, object)
+    def on_finished(self, channel, generation, error):
+        active = self.active.get(channel)
+        if active is None or active[0] != generation:
+            return
+        del self.active[channel]
+        if error is not None:
+            self.failed.emit(channel, error)
+            if active[4] is not None:
+                active[4](error)
+        if active[3] is not None:
+            active[3]()
@@ -21,7 +21,7 @@ def set_environment(software, jobs_dir, job, profile, token_dict):
     os.environ['jobs_dir'] = str(jobs_dir)
     os.environ['job'] = str(job)
     os.environ['profile'] = str(profile)
-    os.environ['token_dict'] = str(token_dict)
+    os.environ['tokens'] = str(token_dict)
 
 def get_software():
     try:
@@ -70,9 +70,47 @@ def get_template():
 
 def get_config_reader():
     job_path = os.path.join(get_jobs_dir(), get_job())
-    env_config_reader = config_reader.ConfigReader(job_path)
+    env_config_reader = config_reader.get_config_reader(job_path)
     return env_config_reader
 
+def find_job_path(path):
+    """ Returns the closest parent directory of path that contains a job config, or an 
+    empty string. 
+    """
+    current_dir = os.path.dirname(path) if os.path.isfile(path) else path
+    while current_dir:
+        if os.path.isfile(os.path.join(current_dir, CONFIG_FILE_NAME)):
+            return current_dir
+        current_dir, check_folder = os.path.split(current_dir)
+        if not check_folder:
+            break
+    return ''
+
+def get_context_from_path(path, software=None):
+    """ Resolves a path back to the launcher profile it belongs to. Returns a tuple of 
+    (config_reader, software, profile, token_dict) or None.
+    """
+    job_path = find_job_path(path)
+    if not job_path:
+        return None
+    path_config_reader = config_reader.get_config_reader(job_path)
+    match = path_config_reader.parse_path(path, software)
+    if match is None:
+        return None
+    return (path_config_reader,) + match
+
+def set_environment_from_path(path, software=None):
+    """ Sets the environment from the location of the given path. Returns the context 
+    from get_context_from_path or None if it couldn't be found.
+    """
+    context = get_context_from_path(path, software)
+    if context is None:
+        return None
+    path_config_reader, path_software, profile, token_dict = context
+    jobs_dir, job = os.path.split(path_config_reader.job_path)
+    set_environment(path_software, jobs_dir, job, profile, token_dict)
+    return context
+
 
 # DEBUG------------------------------------------------------------------------
 if __name__ == '__main__':
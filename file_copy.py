@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import sys
+import stat
+import errno
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# Linux ioctl that makes a file share the blocks of another on Btrfs, XFS and the like
+FICLONE = 0x40049409
+
+
+def copy_file(source, destination, hardlink=False):
+    """Copies a file with its mode and times, as cheaply as the file system allows. Read
+    only files are hardlinked if hardlink is set, otherwise the file is cloned with FICLONE,
+    copied in the kernel with copy_file_range or, failing both, read and written. Returns
+    which of 'link', 'clone', 'range' or 'copy' was used. An existing destination is
+    replaced, never written through.
+    """
+    # It may be a hardlink to the source, writing to it would truncate the source too
+    if os.path.lexists(destination):
+        os.remove(destination)
+
+    if hardlink and hasattr(os, 'link'):
+        # Nothing can change a read only file through the link
+        if not os.stat(source).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+            try:
+                os.link(source, destination)
+                return 'link'
+            except OSError:
+                pass
+
+    with open(source, 'rb') as src:
+        with open(destination, 'wb') as dst:
+            if clone_file(src, dst):
+                method = 'clone'
+            elif copy_range(src, dst):
+                method = 'range'
+            else:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+                method = 'copy'
+        sourceStat = os.fstat(src.fileno())
+    os.chmod(destination, stat.S_IMODE(sourceStat.st_mode))
+    os.utime(destination, (sourceStat.st_atime, sourceStat.st_mtime))
+    return method
+
+def clone_file(src, dst):
+    """ Makes dst share src's blocks. Returns false if the file system can't. """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except (IOError, OSError):
+        return False
+    return True
+
+def copy_range(src, dst):
+    """ Copies src to dst without the data leaving the kernel. Returns false if it isn't
+    supported, such as across file systems on older kernels.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    while True:
+        try:
+            count = os.copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK_SIZE)
+        except OSError as exc:
+            if copied == 0 and exc.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                             errno.EOPNOTSUPP, errno.EBADF):
+                return False
+            raise
+        if count == 0:
+            return True
+        copied += count
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import re
+import sys
+import json
+import sqlite3
+
+try:
+    from urllib import pathname2url
+except ImportError:
+    from urllib.request import pathname2url
+
+import config_reader
+import dir_listing
+import path_template
+
+FILE_INDEX_VERSION = 2
+# Levels of sub folders below a profile's folder whose files are indexed too
+FILE_INDEX_DEPTH = 1
+MAX_RESULTS = 50
+
+# Words are the alphanumeric runs of a path, versions are stored without padding
+WORD_SPLIT_REGEX = re.compile(r'[\W_]+', re.UNICODE)
+VERSION_WORD_REGEX = re.compile(r'^v0*(\d+)$')
+
+FILESYSTEM_ENCODING = sys.getfilesystemencoding() or 'utf-8'
+
+
+def to_text(value):
+    """ Returns value as unicode, sqlite won't store byte strings in text columns. """
+    if isinstance(value, bytes):
+        return value.decode(FILESYSTEM_ENCODING, 'replace')
+    return value
+
+def get_terms(text):
+    """ Returns the list of search terms in a text. Terms are lower case words and versions
+    lose their padding so "v012" and "v12" are the same term.
+    """
+    terms = []
+    for word in WORD_SPLIT_REGEX.split(to_text(text).lower()):
+        if not word:
+            continue
+        match = VERSION_WORD_REGEX.match(word)
+        if match:
+            word = "v" + str(int(match.group(1)))
+        terms.append(word)
+    return terms
+
+def connect_read_only(path):
+    """ Returns a connection that can't write to the database at path. """
+    if sys.version_info[0] < 3:
+        # Python 2 can't open sqlite URIs
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+    return sqlite3.connect("file:" + pathname2url(path) + "?mode=ro", uri=True)
+
+def split_template(template):
+    """Returns a tuple of the folder a compiled template starts in and the "/" separated
+    components below it, the first of them holding a token.
+
+    The folder is the template's leading literal up to its last separator, as written, so
+    roots such as "V:\\" and "\\\\server\\share" are kept whole.
+    """
+    if len(template.segments) == 1:
+        return template.source, []
+    leading = template.segments[0][0]
+    cut = max(leading.rfind("/"), leading.rfind("\\"))
+    root = leading[:max(cut, 0)]
+    # Keep the separator of a root such as "/" or "V:\\"
+    if cut >= 0 and (not root or root.endswith(":")):
+        root = leading[:cut + 1]
+    components = path_template.normalize_path(template.source[cut + 1:]).split("/")
+    return root, [component for component in components if component]
+
+def get_index_path(job_path):
+    return config_reader.get_local_cache_path("files", job_path, ".sqlite")
+
+def update_index(job_path, cancelled=None):
+    """ Brings the file index of a job up to date and yields the job path. Made to run on a 
+    DirScanner, cancelled is an optional threading.Event that stops the walk.
+    """
+    index = FileIndex(job_path)
+    try:
+        index.refresh(cancelled)
+    finally:
+        index.close()
+    yield job_path
+
+
+class ComponentMatcher(object):
+    """Matches folder names against one "/" separated component of a template."""
+
+    def __init__(self, component, excludes):
+        segments = path_template.parse(component)
+        self.literal = component if len(segments) == 1 else None
+        self.tokens = []
+        pattern = ["^"]
+        for literal, token in segments:
+            pattern.append(re.escape(literal))
+            if token is not None:
+                self.tokens.append(token)
+                pattern.append("(.+?)")
+        pattern.append("$")
+        self.regex = re.compile("".join(pattern),
+                                re.IGNORECASE if path_template.CASE_INSENSITIVE else 0)
+        self.excludes = excludes
+
+    def match(self, name, tokenDict):
+        """ Returns tokenDict updated with the values in name, or None if it doesn't match. """
+        if self.literal is not None:
+            if path_template.CASE_INSENSITIVE:
+                return tokenDict if name.lower() == self.literal.lower() else None
+            return tokenDict if name == self.literal else None
+        match = self.regex.match(name)
+        if match is None:
+            return None
+        result = dict(tokenDict)
+        for token, value in zip(self.tokens, match.groups()):
+            # Template folders and excluded folders are never values
+            if value == ".[" + token + "]" or value in self.excludes.get(token, ()):
+                return None
+            if result.get(token, value) != value:
+                return None
+            result[token] = value
+        return result
+
+
+class FileIndex(object):
+    """Index of every file in a job's profile folders, stored in a local SQLite database.
+
+    The profile templates are walked folder by folder and every file is stored with the
+    software, profile and token values of the template that leads to it. Folders are only
+    listed again when their mtime changes so a refresh is mostly one stat per folder.
+    File names are searched through a full text table of their terms.
+    """
+
+    def __init__(self, job_path, index_path=None, read_only=False):
+        """ A read only index never writes so it never waits on a refresh running in another 
+        thread. It raises sqlite3.OperationalError until the index has been created. 
+        """
+        self.job_path = job_path
+        self.index_path = index_path or get_index_path(job_path)
+        self.read_only = read_only
+        if read_only:
+            # Connecting would create an empty database the refresh then has to upgrade
+            if not os.path.isfile(self.index_path):
+                raise sqlite3.OperationalError("No file index at " + self.index_path)
+            self.connection = connect_read_only(self.index_path)
+            return
+        directory = os.path.dirname(self.index_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(self.index_path)
+        self.create_tables()
+
+    def close(self):
+        self.connection.close()
+
+    def create_tables(self):
+        connection = self.connection
+        # Readers don't block the writer and the other way around
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        if self.get_info('version') != str(FILE_INDEX_VERSION):
+            for table in ('dirs', 'files', 'file_terms'):
+                connection.execute("DROP TABLE IF EXISTS " + table)
+            connection.execute("DELETE FROM info")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime REAL, subdirs TEXT, "
+            "has_files INTEGER)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, "
+            "dir TEXT, name TEXT, mtime REAL, software TEXT, profile TEXT, tokens TEXT)")
+        connection.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+        try:
+            connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS file_terms USING fts4(terms)")
+        except sqlite3.OperationalError:
+            connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS file_terms USING fts3(terms)")
+        self.set_info('version', str(FILE_INDEX_VERSION))
+        connection.commit()
+
+    def get_info(self, key):
+        row = self.connection.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO info VALUES (?, ?)", (key, value))
+
+    def clear(self):
+        for table in ('dirs', 'files', 'file_terms'):
+            self.connection.execute("DELETE FROM " + table)
+
+    # Refreshing ---------------------------------------------------------------------------
+
+    def refresh(self, cancelled=None):
+        """ Walks the job's profile templates and updates the folders that changed. Returns
+        false if it was cancelled.
+        """
+        reader = config_reader.get_config_reader(self.job_path)
+        self.cancelled = cancelled
+        # Folders are indexed by the templates that lead to them, start over when they change
+        signature = repr(reader.layers)
+        if self.get_info('config') != signature:
+            self.clear()
+            self.set_info('config', signature)
+
+        self.known_dirs = dict(
+            (path, (mtime, json.loads(subdirs), bool(has_files)))
+            for path, mtime, subdirs, has_files in
+            self.connection.execute("SELECT path, mtime, subdirs, has_files FROM dirs"))
+        # path -> whether its files were read during this refresh
+        self.visited = dict()
+
+        try:
+            for software in reader.get_software_list():
+                for profile, templateString in sorted(
+                        reader.get_launcher_profiles(software).items()):
+                    if not self.walk_template(reader, software, profile, templateString):
+                        self.connection.rollback()
+                        return False
+                    # Searches see each profile as soon as it's done
+                    self.connection.commit()
+
+            # Folders that weren't reached are gone or no longer part of a template
+            for path in set(self.known_dirs) - set(self.visited):
+                self.connection.execute("DELETE FROM dirs WHERE path = ?", (path,))
+                self.delete_files(self.connection.execute(
+                    "SELECT id FROM files WHERE dir = ?", (path,)).fetchall())
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return True
+
+    def walk_template(self, reader, software, profile, templateString):
+        template = reader.bind_template(templateString)
+        root, components = split_template(template)
+        excludes = dict((token, reader.get_excludes(token)) for token in template.tokens)
+        matchers = [ComponentMatcher(component, excludes) for component in components]
+        return self.walk(root, matchers, 0, dict(), (software, profile))
+
+    def walk(self, path, matchers, level, tokenDict, context):
+        """ Indexes path, level components into the template. Returns false if cancelled. """
+        if self.cancelled is not None and self.cancelled.is_set():
+            return False
+        is_leaf = level >= len(matchers)
+        listing = self.read_dir(path, is_leaf)
+        if listing is None:
+            return True
+        subdirs, files = listing
+
+        if is_leaf:
+            if files is not None:
+                self.update_files(path, files, context, tokenDict)
+            if level - len(matchers) >= FILE_INDEX_DEPTH:
+                return True
+            for name in subdirs:
+                if not name.startswith("."):
+                    if not self.walk(os.path.join(path, name), matchers, level + 1,
+                                     tokenDict, context):
+                        return False
+            return True
+
+        for name in subdirs:
+            childTokens = matchers[level].match(name, tokenDict)
+            if childTokens is not None:
+                if not self.walk(os.path.join(path, name), matchers, level + 1,
+                                 childTokens, context):
+                    return False
+        return True
+
+    def read_dir(self, path, with_files):
+        """ Returns a tuple of the sub folder names of path and its files, or None if it
+        can't be read. Files are None if they're not wanted or haven't changed since they
+        were indexed. A folder one template passes through can be another's leaf, so its
+        files are read the first time a template wants them.
+        """
+        path = to_text(path)
+        if path in self.visited and (self.visited[path] or not with_files):
+            known = self.known_dirs.get(path)
+            return (known[1], None) if known is not None else None
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+
+        known = self.known_dirs.get(path)
+        if known is not None and known[0] == mtime and (known[2] or not with_files):
+            self.visited[path] = known[2]
+            return known[1], None
+        self.visited[path] = with_files
+
+        try:
+            # Not through the shared listing cache, the walk would flush it
+            entries = dir_listing.list_dir(path, with_mtime=with_files)
+        except OSError:
+            return None
+        subdirs = sorted(to_text(entry.name) for entry in entries if entry.is_dir)
+        files = [entry for entry in entries if not entry.is_dir]
+        self.known_dirs[path] = (mtime, subdirs, with_files)
+        self.connection.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                                (path, mtime, json.dumps(subdirs), int(with_files)))
+        return subdirs, files
+
+    def update_files(self, path, files, context, tokenDict):
+        """ Makes the stored files of the folder at path match the given entries. """
+        path = to_text(path)
+        # name -> (id, mtime)
+        stored = dict((name, (fileId, mtime)) for name, fileId, mtime in
+                      self.connection.execute(
+                          "SELECT name, id, mtime FROM files WHERE dir = ?", (path,)))
+        software, profile = context
+        tokens = json.dumps(tokenDict, sort_keys=True)
+        relative_dir = os.path.relpath(path, self.job_path)
+        for entry in files:
+            name = to_text(entry.name)
+            known = stored.pop(name, None)
+            if known is not None:
+                # Overwritten files move up the newest first results
+                if known[1] != entry.mtime:
+                    self.connection.execute(
+                        "UPDATE files SET mtime = ? WHERE id = ?", (entry.mtime, known[0]))
+                continue
+            cursor = self.connection.execute(
+                "INSERT OR REPLACE INTO files (path, dir, name, mtime, software, profile, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (to_text(entry.path), path, name, entry.mtime, software, profile, tokens))
+            terms = get_terms(os.path.join(relative_dir, name)) + [software.lower()]
+            self.connection.execute("INSERT INTO file_terms (docid, terms) VALUES (?, ?)",
+                                    (cursor.lastrowid, " ".join(terms)))
+        self.delete_files([(fileId,) for fileId, _ in stored.values()])
+
+    def delete_files(self, rows):
+        for row in rows:
+            self.connection.execute("DELETE FROM files WHERE id = ?", row)
+            self.connection.execute("DELETE FROM file_terms WHERE docid = ?", row)
+
+    # Searching ----------------------------------------------------------------------------
+
+    def search(self, query, software=None, extensions=None, limit=MAX_RESULTS):
+        """Returns a list of dictionaries describing the files matching every term of the
+        query, newest first. Terms match the start of words in any order, so "sh010 comp v12"
+        finds ".../sh010/comp/nuke/sh010_comp_v012.nk".
+
+        Each dictionary holds path, name, mtime, software, profile and tokens.
+        """
+        terms = get_terms(query)
+        if not terms:
+            return []
+        # Terms are lower case words so FTS never reads them as operators
+        match = " ".join(term + "*" for term in terms)
+        sql = ("SELECT files.path, files.name, files.mtime, files.software, files.profile, "
+               "files.tokens FROM file_terms JOIN files ON files.id = file_terms.docid "
+               "WHERE file_terms MATCH ?")
+        arguments = [match]
+        if software is not None:
+            sql += " AND files.software = ?"
+            arguments.append(software)
+        sql += " ORDER BY files.mtime DESC"
+        try:
+            rows = self.connection.execute(sql, arguments).fetchall()
+        except sqlite3.OperationalError:
+            # Not indexed yet
+            return []
+        results = []
+        for path, name, mtime, row_software, profile, tokens in rows:
+            if extensions and not name.lower().endswith(tuple(extensions)):
+                continue
+            results.append({
+                'path': path,
+                'name': name,
+                'mtime': mtime,
+                'software': row_software,
+                'profile': profile,
+                'tokens': json.loads(tokens),
+            })
+            if len(results) >= limit:
+                break
+        return results
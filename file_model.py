@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import time
+
+try:
+    # < Nuke 11
+    import PySide.QtCore as QtCore
+    import PySide.QtGui as QtGuiWidgets
+except:
+    # >= Nuke 11
+    import PySide2.QtCore as QtCore
+    import PySide2.QtWidgets as QtGuiWidgets
+
+import dir_listing
+import dir_scanner
+import versioning
+
+# Number of rows handed to the view every time it asks for more
+FETCH_BATCH_SIZE = 500
+# Role returning the full path of an index
+PATH_ROLE = QtCore.Qt.UserRole
+COLUMNS = ["Name", "Date"]
+DATE_FORMAT = '%m/%d/%y %H:%M'
+_DATE_CACHE_LIMIT = 4096
+
+
+class IconCache(object):
+    """Shares file icons between every file with the same extension, so the icon provider
+    only looks at the disk or the shell once per file type.
+    """
+
+    def __init__(self):
+        self.provider = None
+        self.icons = dict()
+
+    def icon(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        icon = self.icons.get(extension)
+        if icon is None:
+            # Created on first use, the provider needs a QApplication
+            if self.provider is None:
+                self.provider = QtGuiWidgets.QFileIconProvider()
+            icon = self.provider.icon(QtCore.QFileInfo(path))
+            self.icons[extension] = icon
+        return icon
+
+
+class DateFormatter(object):
+    """Formats mtimes for display. The format only shows minutes so strings are cached per
+    minute, most files in a folder share a handful of them.
+    """
+
+    def __init__(self, date_format=DATE_FORMAT):
+        self.date_format = date_format
+        self.strings = dict()
+
+    def format(self, mtime):
+        minute = int(mtime // 60)
+        string = self.strings.get(minute)
+        if string is None:
+            if len(self.strings) >= _DATE_CACHE_LIMIT:
+                self.strings.clear()
+            string = time.strftime(self.date_format, time.localtime(minute * 60))
+            self.strings[minute] = string
+        return string
+
+
+icon_cache = IconCache()
+date_formatter = DateFormatter()
+
+
+def group_versions(entries):
+    """Groups the versions of every file by its name without the version.
+
+    Returns a tuple of the entries to show, the latest version of each versioned file plus
+    everything unversioned, and a dictionary of the older versions of each file, newest
+    first, keyed by the path of its latest version.
+    """
+    shown = []
+    groups = dict()
+    for entry in entries:
+        split = None if entry.is_dir else versioning.split_version(entry.name)
+        if split is None:
+            shown.append(entry)
+            continue
+        name, version = split
+        groups.setdefault(name, []).append((version, entry.mtime or 0, entry))
+
+    history = dict()
+    for versions in groups.values():
+        versions.sort(key=lambda version: version[:2])
+        latest = versions[-1][2]
+        shown.append(latest)
+        if len(versions) > 1:
+            history[latest.path] = [version[2] for version in reversed(versions[:-1])]
+    return shown, history
+
+
+class FileNode(object):
+    """An entry of the file tree. The listing of a directory is kept as sorted DirEntries and
+    nodes are only created for the rows the view has fetched.
+    """
+    __slots__ = ('name', 'path', 'is_dir', 'mtime', 'parent', 'row', 'entries', 'children',
+                 'loading')
+
+    def __init__(self, entry, parent=None, row=0):
+        self.name = entry.name
+        self.path = entry.path
+        self.is_dir = entry.is_dir
+        self.mtime = entry.mtime
+        self.parent = parent
+        self.row = row
+        # None until the directory has been listed
+        self.entries = None
+        self.children = []
+        self.loading = False
+
+
+class FileTreeModel(QtCore.QAbstractItemModel):
+    """Two column (name, date) model of the files below a root directory.
+
+    Directories are listed in the background by a DirScanner when the view first asks for
+    their rows, and rows are handed to the view in batches through canFetchMore/fetchMore.
+    Sorting happens on the listings, so only the rows the view has fetched are ever built.
+
+    With group_versions set every versioned file is shown once at its latest version and
+    its older versions are its children, newest first whatever the sort.
+    """
+    # Emitted with the index of a directory once its listing has arrived
+    loaded = QtCore.Signal(object)
+
+    def __init__(self, scanner, parent=None, group_versions=False):
+        super(FileTreeModel, self).__init__(parent)
+        self.scanner = scanner
+        self.group_versions = group_versions
+        # Latest version path -> older version entries
+        self.history = dict()
+        self.extensions = None
+        self.sort_column = 0
+        self.sort_order = QtCore.Qt.AscendingOrder
+        self.root = self.create_root(None)
+
+    def create_root(self, path):
+        root = FileNode(dir_listing.DirEntry('', path, True, None))
+        if path is None:
+            root.entries = []
+        return root
+
+    def set_root(self, path, extensions=None):
+        """ Shows the contents of path, only listing files ending in extensions if given. """
+        self.cancel()
+        self.beginResetModel()
+        self.extensions = extensions
+        self.history = dict()
+        self.root = self.create_root(path)
+        self.endResetModel()
+
+    def set_group_versions(self, group_versions):
+        """ Turns version grouping on or off and lists the root again. """
+        if group_versions != self.group_versions:
+            self.group_versions = group_versions
+            self.set_root(self.root.path, self.extensions)
+
+    def clear(self):
+        self.set_root(None)
+
+    def cancel(self):
+        """ Cancels every listing still running. """
+        self.scanner.cancel_group('files')
+        self.scanner.cancel_group('expand')
+
+    def node(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    def node_index(self, node, column=0):
+        if node is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, column, node)
+
+    def file_path(self, index):
+        """ Returns the path of the given index, or None for the root. """
+        if not index.isValid():
+            return None
+        return self.node(index).path
+
+    # QAbstractItemModel -------------------------------------------------------------------
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if 0 <= row < len(node.children) and 0 <= column < len(COLUMNS):
+            return self.createIndex(row, column, node.children[row])
+        return QtCore.QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(COLUMNS)
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if parent.column() > 0:
+            return False
+        if not node.is_dir:
+            # Files only have children when they have older versions
+            return bool(node.entries)
+        # Unlisted directories show an expander until they turn out to be empty
+        return node.entries is None or len(node.entries) > 0
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        if parent.column() > 0:
+            return False
+        if node.entries is None:
+            return node.is_dir and not node.loading
+        return len(node.children) < len(node.entries)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node.entries is None:
+            self.load(node)
+        else:
+            self.fetch(node)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """ Icons and dates are only looked up here, when the view paints a row. """
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if column == 0:
+                return node.name
+            if node.mtime is not None:
+                return date_formatter.format(node.mtime)
+        elif role == QtCore.Qt.DecorationRole:
+            if column == 0 and not node.is_dir:
+                return icon_cache.icon(node.path)
+        elif role == PATH_ROLE:
+            return node.path
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if (orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole
+                and 0 <= section < len(COLUMNS)):
+            return COLUMNS[section]
+        return None
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        nodes = [(index.internalPointer(), index.column()) for index in persistent]
+        self.sort_node(self.root)
+        for index, (node, column) in zip(persistent, nodes):
+            if self.is_attached(node):
+                self.changePersistentIndex(index, self.createIndex(node.row, column, node))
+            else:
+                self.changePersistentIndex(index, QtCore.QModelIndex())
+        self.layoutChanged.emit()
+
+    # Loading ------------------------------------------------------------------------------
+
+    def load(self, node):
+        """ Lists the directory of node in the background. """
+        node.loading = True
+        if node is self.root:
+            channel = ('files', None)
+        else:
+            channel = ('expand', node.path)
+        self.scanner.scan(channel, dir_scanner.scan_file_entries, (node.path, self.extensions),
+            on_chunk=lambda entries: self.on_loaded(node, entries),
+            on_done=lambda: self.on_loaded(node, []))
+
+    def on_loaded(self, node, entries):
+        if not node.loading:
+            return
+        node.loading = False
+        if self.group_versions:
+            entries, history = group_versions(entries)
+            self.history.update(history)
+        node.entries = self.sorted_entries(entries)
+        index = self.node_index(node)
+        if not node.entries and node is not self.root:
+            # Let the view drop the expander
+            self.dataChanged.emit(index, index)
+        self.fetch(node)
+        self.loaded.emit(index)
+
+    def fetch(self, node):
+        """ Adds the next batch of rows under node. """
+        start = len(node.children)
+        end = min(len(node.entries), start + FETCH_BATCH_SIZE)
+        if end <= start:
+            return
+        self.beginInsertRows(self.node_index(node), start, end - 1)
+        for row in range(start, end):
+            node.children.append(self.create_node(node.entries[row], node, row))
+        self.endInsertRows()
+
+    def create_node(self, entry, parent, row):
+        """ Returns the node of an entry, with the older versions of the file if it has any. """
+        node = FileNode(entry, parent, row)
+        history = self.history.get(node.path)
+        if history is not None:
+            node.entries = list(history)
+        return node
+
+    def find_index(self, path):
+        """ Returns the index of the file at path in the root folder or in the version history 
+        of one of its files, fetching rows up to it if needed. Returns an invalid index if 
+        it isn't listed.
+        """
+        path = os.path.normpath(path)
+        for row, entry in enumerate(self.root.entries or ()):
+            entry_path = os.path.normpath(entry.path)
+            history = self.history.get(entry.path, ())
+            if entry_path != path and not any(
+                    os.path.normpath(old.path) == path for old in history):
+                continue
+            while len(self.root.children) <= row:
+                self.fetch(self.root)
+            node = self.root.children[row]
+            if entry_path == path:
+                return self.createIndex(row, 0, node)
+            for history_row, old in enumerate(node.entries):
+                if os.path.normpath(old.path) == path:
+                    while len(node.children) <= history_row:
+                        self.fetch(node)
+                    return self.createIndex(history_row, 0, node.children[history_row])
+        return QtCore.QModelIndex()
+
+    def latest_index(self, parent=QtCore.QModelIndex()):
+        """ Returns the index of the most recently modified file under parent, fetching rows 
+        up to it if needed, or an invalid index if there are no files. 
+        """
+        node = self.node(parent)
+        files = [(entry.mtime or 0, row) for row, entry in enumerate(node.entries or ())
+                 if not entry.is_dir]
+        if not files:
+            return QtCore.QModelIndex()
+        row = max(files)[1]
+        while len(node.children) <= row:
+            self.fetch(node)
+        return self.createIndex(row, 0, node.children[row])
+
+    def refresh(self, index):
+        """ Lists the directory of index again if it has been listed before. """
+        node = self.node(index)
+        # Version history is listed with its folder
+        if not node.is_dir or node.entries is None or node.loading:
+            return
+        if node.children:
+            self.beginRemoveRows(index, 0, len(node.children) - 1)
+            node.children = []
+            self.endRemoveRows()
+        node.entries = None
+        self.load(node)
+
+    # Sorting ------------------------------------------------------------------------------
+
+    def sorted_entries(self, entries):
+        if self.sort_column == 1:
+            key = lambda entry: (entry.mtime or 0, entry.name)
+        else:
+            key = lambda entry: entry.name
+        return sorted(entries, key=key, reverse=self.sort_order == QtCore.Qt.DescendingOrder)
+
+    def sort_node(self, node):
+        """ Sorts the listing of node and its listed children, keeping the fetched row count. """
+        # Older versions of a file stay newest first
+        if node.entries is None or not node.is_dir:
+            return
+        node.entries = self.sorted_entries(node.entries)
+        fetched = dict((child.name, child) for child in node.children)
+        children = []
+        for row, entry in enumerate(node.entries[:len(node.children)]):
+            child = fetched.pop(entry.name, None)
+            if child is None:
+                child = self.create_node(entry, node, row)
+            child.row = row
+            children.append(child)
+        # Rows that were fetched but are now past the fetched range
+        for child in fetched.values():
+            child.row = -1
+        node.children = children
+        for child in children:
+            self.sort_node(child)
+
+    def is_attached(self, node):
+        while node is not None and node is not self.root:
+            if node.row < 0:
+                return False
+            node = node.parent
+        return node is self.root
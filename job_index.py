@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+import config_reader
+import dir_listing
+
+# Constants
+from pipeline_config import CONFIG_FILE_NAME
+
+JOB_INDEX_VERSION = 2
+# Stats on network shares are mostly latency, run this many at once
+JOB_INDEX_THREADS = 16
+
+# layers are the (path, signature) tuples of the job config and the configs it inherits,
+# software is the sorted list of software in the resolved config or empty if it can't be
+# read. Both are only read once a software is asked for, until then software is None and
+# layers only holds the job config.
+JobRecord = namedtuple('JobRecord', ['name', 'config_path', 'layers', 'software'])
+
+
+class JobIndex(object):
+    """Index of the jobs in a jobs directory, stored in the local cache dir.
+
+    A job is a folder holding a config file. The folders are only listed again when the
+    jobs directory's mtime changes and a refresh only stats the configs, in parallel. The
+    configs are parsed the first time the jobs of a software are asked for, and again when
+    the config or one it inherits changes.
+    """
+
+    def __init__(self, jobs_dir, config_file_name=CONFIG_FILE_NAME):
+        self.jobs_dir = jobs_dir
+        self.config_file_name = config_file_name
+        self.root_mtime = None
+        # Every folder in the jobs dir, a folder can become a job when a config is added
+        self.folders = []
+        # name -> JobRecord
+        self.jobs = dict()
+
+    def get_cache_path(self):
+        return config_reader.get_local_cache_path("jobs", self.jobs_dir)
+
+    def load(self):
+        """ Reads the stored index. Returns false if there is none. """
+        cache = config_reader.read_local_cache(self.get_cache_path())
+        if (not isinstance(cache, dict)
+                or cache.get('version') != JOB_INDEX_VERSION
+                or cache.get('jobs_dir') != os.path.abspath(self.jobs_dir)
+                or cache.get('config_file_name') != self.config_file_name):
+            return False
+        self.root_mtime = cache['root_mtime']
+        self.folders = cache['folders']
+        self.jobs = dict((record[0], JobRecord(*record)) for record in cache['jobs'])
+        return True
+
+    def save(self):
+        config_reader.write_local_cache(self.get_cache_path(), {
+            'version': JOB_INDEX_VERSION,
+            'jobs_dir': os.path.abspath(self.jobs_dir),
+            'config_file_name': self.config_file_name,
+            'root_mtime': self.root_mtime,
+            'folders': self.folders,
+            # Stored as tuples so the file doesn't depend on this module
+            'jobs': [tuple(record) for record in self.jobs.values()],
+        })
+
+    def get_jobs(self, software=None):
+        """ Returns the sorted names of the indexed jobs, only the ones whose config includes
+        software if it's given.
+        """
+        if software is not None:
+            self.read_software()
+        return sorted(name for name, record in self.jobs.items()
+                      if software is None or software in (record.software or ()))
+
+    def get_record(self, job):
+        return self.jobs.get(job)
+
+    def refresh(self):
+        """ Brings the index up to date with the jobs dir and stores it if anything changed.
+        Returns true if the list of jobs or any of their records changed.
+        """
+        try:
+            root_mtime = os.stat(self.jobs_dir).st_mtime
+        except OSError:
+            root_mtime = None
+
+        folders = self.folders
+        if root_mtime is None:
+            folders = []
+        elif root_mtime != self.root_mtime:
+            folders = dir_listing.list_dir_names(self.jobs_dir, files=False)
+
+        records = self.map(self.read_record, folders)
+        jobs = dict((record.name, record) for record in records if record is not None)
+
+        changed = jobs != self.jobs
+        if changed or root_mtime != self.root_mtime or folders != self.folders:
+            self.root_mtime = root_mtime
+            self.folders = folders
+            self.jobs = jobs
+            self.save()
+        return changed
+
+    def read_software(self):
+        """ Reads the software of the jobs whose configs weren't read yet and stores the
+        index if there were any.
+        """
+        unread = [record for record in self.jobs.values() if record.software is None]
+        if not unread:
+            return
+        for record in self.map(self.read_config, unread):
+            self.jobs[record.name] = record
+        self.save()
+
+    def map(self, function, items):
+        """ Returns the results of function for each item, run on a thread pool. """
+        if not items:
+            return []
+        pool = ThreadPool(min(JOB_INDEX_THREADS, len(items)))
+        try:
+            return pool.map(function, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    def read_record(self, folder):
+        """ Returns the JobRecord of a folder, or None if it doesn't hold a config. The
+        stored record is kept while none of its configs changed.
+        """
+        config_path = os.path.join(self.jobs_dir, folder, self.config_file_name)
+        try:
+            signature = config_reader.get_file_signature(config_path)
+        except OSError:
+            return None
+        record = self.jobs.get(folder)
+        if record is not None and is_record_current(record):
+            return record
+        return JobRecord(folder, config_path, ((config_path, signature),), None)
+
+    def read_config(self, record):
+        """ Returns the record with the layers and software of its resolved config. """
+        try:
+            config, layers = config_reader.load_config(record.config_path)
+            software = sorted((config.get('software') or {}).keys())
+        except Exception:
+            # Read again once the config changes
+            return record._replace(software=[])
+        return record._replace(layers=tuple(layers), software=software)
+
+
+def is_record_current(record):
+    """ Returns true if none of the configs of a record changed since it was read. """
+    try:
+        return all(config_reader.get_file_signature(path) == signature
+                   for path, signature in record.layers)
+    except OSError:
+        return False
+
+
+def get_jobs(jobs_dir, config_file_name=CONFIG_FILE_NAME, software=None):
+    """ Returns the sorted names of the jobs in jobs_dir after refreshing its index. """
+    index = JobIndex(jobs_dir, config_file_name)
+    index.load()
+    index.refresh()
+    return index.get_jobs(software)
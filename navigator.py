@@ -3,12 +3,12 @@
 
 import os
 import sys
-import time
 from collections import OrderedDict
 import yaml
 import ast
 import platform
 import subprocess
+import threading
 
 try:
     # < Nuke 11
@@ -24,6 +24,12 @@ except:
     import PySide2.QtUiTools as QtUiTools
 
 import config_reader
+import dir_listing
+import dir_scanner
+import file_index
+import file_model
+import job_index
+import navigator_model
 import project_creator
 import software_tools
 
@@ -43,8 +49,24 @@ from pipeline_config import DEFAULT_JOBS_DIR
 from pipeline_config import CONFIG_FILE_NAME
 from pipeline_config import LOCAL_CONFIG_PATH
 
+# Milliseconds the token selection has to settle before folders are listed
+CASCADE_DELAY = 50
+# Show versioned files once at their latest version by default
+GROUP_VERSIONS = True
+# Milliseconds typing has to pause before the quick open box searches
+QUICK_OPEN_DELAY = 100
 
-class DeselectableTreeWidget(QtGuiWidgets.QTreeWidget):
+def get_recent_label(job, token_order, tokens):
+    """ Returns the text shown for a recent selection in the recents combo. """
+    return " / ".join([job] + [tokens[token] for token in token_order])
+
+def is_same_recent(recent, other):
+    """ Returns true if two recents select the same thing, whatever their labels. """
+    return all(recent.get(key) == other.get(key)
+               for key in ('jobs_dir', 'job', 'profile', 'tokens'))
+
+
+class DeselectableTreeView(QtGuiWidgets.QTreeView):
     def mousePressEvent(self, event):
         self.clearSelection()
         QtGuiWidgets.QTreeView.mousePressEvent(self, event)
@@ -64,18 +86,52 @@ class Navigator(QtGuiWidgets.QDialog):
         self.current_software_tools = current_software_tools
         self.software = current_software_tools.software
         self.token_obj_dict = OrderedDict()
-        self.jobs_dir = DEFAULT_JOBS_DIR
-        self.current_job_path = ""
-        # Override self.extensions to set what files to list
-        self.extensions = extensions
-        self.template = ""
+        # The navigation state, the widgets follow it through on_model_change. Override
+        # get_extensions to set what files to list
+        self.model = navigator_model.NavigatorModel(self.software, extensions, DEFAULT_JOBS_DIR)
         self.finalPath = ""
-        self.configReader = None
+        self.scanner = dir_scanner.DirScanner(self)
+        self.scanner.failed.connect(self.on_scan_failed)
+        # Changes to the selection only mark what's out of date, see schedule_cascade
+        self.cascade_index = None
+        self.default_job_pending = False
+        self.cascade_timer = QtCore.QTimer(self)
+        self.cascade_timer.setSingleShot(True)
+        self.cascade_timer.setInterval(CASCADE_DELAY)
+        self.cascade_timer.timeout.connect(self.resolve_cascade)
+        # File selected once the file list arrives, see open_search_result
+        self.pending_file = None
+        self.file_index = None
+        self.index_cancelled = threading.Event()
+        self.search_results = dict()
         self.initUI()
+        self.model.subscribe(self.on_model_change)
         self.populate_jobs()
         self.populate_recents()
+        self.prefetch_recents()
         self.show()
 
+    # The state lives in the model, these are kept for the tools built on the dialog
+    @property
+    def jobs_dir(self):
+        return self.model.jobs_dir
+
+    @property
+    def current_job_path(self):
+        return self.model.job_path
+
+    @property
+    def configReader(self):
+        return self.model.configReader
+
+    @property
+    def template(self):
+        return self.model.template
+
+    @property
+    def extensions(self):
+        return self.model.extensions
+
     def initUI(self):
         self.jobs_dir_label = QtGuiWidgets.QLabel(self.jobs_dir)
         self.jobs_dir_label.setStyleSheet('text-decoration: underline')
@@ -88,12 +144,28 @@ class Navigator(QtGuiWidgets.QDialog):
         self.profile_combo = QtGuiWidgets.QComboBox()
         self.profile_combo.activated[str].connect(self.on_profile_change)
 
+        self.quick_open_edit = QtGuiWidgets.QLineEdit()
+        self.quick_open_edit.setPlaceholderText("Search the job, e.g. sh010 comp v12")
+        self.quick_open_model = QtCore.QStringListModel(self)
+        self.quick_open_completer = QtGuiWidgets.QCompleter(self.quick_open_model, self)
+        # The index has already matched the results
+        self.quick_open_completer.setCompletionMode(
+            QtGuiWidgets.QCompleter.UnfilteredPopupCompletion)
+        self.quick_open_completer.activated[str].connect(self.on_quick_open_activated)
+        self.quick_open_edit.setCompleter(self.quick_open_completer)
+        self.quick_open_timer = QtCore.QTimer(self)
+        self.quick_open_timer.setSingleShot(True)
+        self.quick_open_timer.setInterval(QUICK_OPEN_DELAY)
+        self.quick_open_timer.timeout.connect(self.on_quick_open_search)
+        self.quick_open_edit.textEdited.connect(lambda text: self.quick_open_timer.start())
+
         form_layout = QtGuiWidgets.QFormLayout()
         form_layout.addRow("Recent: ", self.recents_combo)
         form_layout.addRow('', QHLine())
         form_layout.addRow("Jobs Dir: ", self.jobs_dir_label)
         form_layout.addRow("Job: ", self.job_combo)
         form_layout.addRow("Profile: ", self.profile_combo)
+        form_layout.addRow("Quick Open: ", self.quick_open_edit)
         form_widget = QtGuiWidgets.QWidget()
         form_widget.setLayout(form_layout)
         form_widget.setFixedWidth(400)
@@ -101,9 +173,13 @@ class Navigator(QtGuiWidgets.QDialog):
         self.token_grid = QtGuiWidgets.QGridLayout()
 
         self.file_label = QtGuiWidgets.QLabel("File")
-        self.file_tree_widget = DeselectableTreeWidget()
+        self.file_model = file_model.FileTreeModel(self.scanner, self, GROUP_VERSIONS)
+        self.file_model.loaded.connect(self.on_files_loaded)
+        self.file_tree_widget = DeselectableTreeView()
+        self.file_tree_widget.setModel(self.file_model)
+        self.file_tree_widget.setUniformRowHeights(True)
         self.file_tree_widget.setSortingEnabled(True)
-        self.file_tree_widget.setHeaderLabels(["Name", "Date"])
+        self.file_tree_widget.sortByColumn(0, QtCore.Qt.AscendingOrder)
         # self.file_tree_widget.setColumnWidth(0, 230)
         self.file_tree_widget.header().setStretchLastSection(False)
         try:
@@ -116,17 +192,22 @@ class Navigator(QtGuiWidgets.QDialog):
                 0, QtGuiWidgets.QHeaderView.Stretch)
             self.file_tree_widget.header().setSectionResizeMode(
                 1, QtGuiWidgets.QHeaderView.ResizeToContents)
-        self.file_tree_widget.currentItemChanged.connect(self.on_file_change)
-        self.file_tree_widget.itemExpanded.connect(self.on_file_expand)
+        self.file_tree_widget.selectionModel().currentChanged.connect(self.on_file_change)
+        self.file_tree_widget.expanded.connect(self.on_file_expand)
         self.file_line_edit = QtGuiWidgets.QLineEdit()
         self.file_line_edit.textEdited.connect(self.on_file_line_change)
+        self.version_check = QtGuiWidgets.QCheckBox("Latest versions only")
+        self.version_check.setChecked(GROUP_VERSIONS)
+        self.version_check.toggled.connect(self.file_model.set_group_versions)
 
         self.file_vbox = QtGuiWidgets.QVBoxLayout()
         self.file_vbox.addWidget(self.file_label)
         self.file_vbox.addWidget(self.file_tree_widget)
         self.file_vbox.addWidget(self.file_line_edit)
+        self.file_vbox.addWidget(self.version_check)
 
-        self.file_widgets = [self.file_label, self.file_tree_widget, self.file_line_edit]
+        self.file_widgets = [self.file_label, self.file_tree_widget, self.file_line_edit,
+            self.version_check]
 
         self.path_label = QtGuiWidgets.QLabel()
         self.path_label.mousePressEvent = self.path_label_click
@@ -166,13 +247,18 @@ class Navigator(QtGuiWidgets.QDialog):
         selected_directory = QtGuiWidgets.QFileDialog.getExistingDirectory(
             dir=os.path.expanduser('~'))
         if selected_directory:
-            self.jobs_dir = selected_directory
-            self.jobs_dir_label.setText(self.jobs_dir)
+            self.model.set_jobs_dir(selected_directory)
             self.populate_jobs()
 
     def populate_recents(self):
+        """ Fills the recents combo from the labels stored with each recent, the configs of
+        the jobs are only read when one is picked. Recents saved before labels were stored
+        are labelled once from their config and saved again, with the folders prefetched 
+        for them.
+        """
+        localConfig = self.read_local_config()
         try:
-            recents_list = self.read_local_config()[self.software]
+            recents_list = localConfig[self.software]
             # If it's not a list, don't try to load
             if not isinstance(recents_list, list):
                 return
@@ -180,37 +266,88 @@ class Navigator(QtGuiWidgets.QDialog):
             recents_list = []
 
         recents_str_list = []
+        upgraded = False
         for recent_option in recents_list:
-            recent_config_reader = config_reader.ConfigReader(
-                os.path.join(recent_option['jobs_dir'], recent_option['job']))
-            template_string = recent_config_reader.get_profile_template(
-                self.software, recent_option['profile'])
-            token_list = recent_config_reader.get_tokens(template_string)
-            recent_str = recent_option['job']
-            for token in token_list:
-                recent_str = recent_str + " / " + recent_option['tokens'][token]
-            recents_str_list.append(recent_str)
+            if 'label' in recent_option:
+                recents_str_list.append(recent_option['label'])
+                continue
+            try:
+                recent_config_reader = config_reader.get_config_reader(
+                    os.path.join(recent_option['jobs_dir'], recent_option['job']))
+                template_string = recent_config_reader.get_profile_template(
+                    self.software, recent_option['profile'])
+                token_list = recent_config_reader.get_tokens(template_string)
+            except:
+                # Labelled properly once the config can be read
+                recents_str_list.append(get_recent_label(recent_option['job'], 
+                    sorted(recent_option['tokens']), recent_option['tokens']))
+                continue
+            recent_option['label'] = get_recent_label(
+                recent_option['job'], token_list, recent_option['tokens'])
+            recent_option['paths'] = [str(path) for path in navigator_model.get_selection_paths(
+                recent_config_reader, template_string, recent_option['tokens'])]
+            upgraded = True
+            recents_str_list.append(recent_option['label'])
 
         self.recents_combo.addItems(recents_str_list)
+        if upgraded:
+            self.write_local_config(localConfig)
 
     def on_recents_change(self,index):
         self.load_recents(index=index)
 
     def populate_jobs(self):
-        """ Look in jobs folder for jobs that contain the config file at root. """
-        jobsList = self.getDirList(self.jobs_dir)
-        jobsList[:] = [job for job in jobsList if os.path.isfile(
-            os.path.join(self.jobs_dir, job, CONFIG_FILE_NAME))]
+        """ Look in jobs folder for jobs that contain the config file at root. The jobs from 
+        the stored job index are shown straight away and the index is refreshed in the 
+        background.
+        """
         self.job_combo.clear()
-        self.job_combo.addItems(jobsList)
-        if len(jobsList) > 0:
-            self.on_job_change(jobsList[0])
+        index = job_index.JobIndex(self.jobs_dir, CONFIG_FILE_NAME)
+        if index.load():
+            self.on_jobs_scanned(index.get_jobs())
+        self.scanner.scan(('jobs', None), dir_scanner.scan_jobs, 
+            (self.jobs_dir, CONFIG_FILE_NAME), on_chunk=self.on_jobs_scanned)
+
+    def on_scan_failed(self, channel, error):
+        """ Reports a background scan that raised, its list is left as it was. """
+        self.current_software_tools.debug_msg(
+            "Scan of " + str(channel) + " failed: " + str(error))
+
+    def on_jobs_scanned(self, jobsList):
+        """ Fills in the job combo box once the jobs folder is scanned. The job that is already 
+        loaded is kept, otherwise the first job is loaded once the cascade resolves so a 
+        recent job applied in the meantime wins.
+        """
+        if jobsList != [self.job_combo.itemText(i) for i in range(self.job_combo.count())]:
+            self.job_combo.clear()
+            self.job_combo.addItems(jobsList)
+        if self.is_current_job_listed():
+            self.setComboBox(self.job_combo, os.path.basename(self.current_job_path))
         else:
-            self.on_job_change(None)
+            self.default_job_pending = True
+            self.cascade_timer.start()
+
+    def is_current_job_listed(self):
+        current_job = os.path.basename(self.current_job_path)
+        return (self.job_combo.findText(current_job) >= 0
+                and self.current_job_path == os.path.join(self.jobs_dir, current_job))
+
+    def on_model_change(self, event, value):
+        """ Updates the widgets when the navigation state changes. """
+        if event == 'jobs_dir':
+            self.jobs_dir_label.setText(value)
+        elif event == 'job':
+            self.on_job_loaded(value)
+        elif event == 'profile':
+            self.create_token_grid(self.model.tokens)
+        elif event == 'token':
+            self.on_token_set(value)
+        elif event == 'tokens':
+            self.on_tokens_set()
 
     def populate_profiles(self):
         """Fill in the profiles combo box with options from the project config"""
-        profileList = self.configReader.get_launcher_profiles(self.software).keys()
+        profileList = self.model.get_profiles()
         self.profile_combo.clear()
         self.profile_combo.addItems(profileList)
         profile = ""
@@ -221,14 +358,17 @@ class Navigator(QtGuiWidgets.QDialog):
 
     def on_job_change(self, job):
         """Called whenever the job combo box is changed"""
+        self.model.set_job(job)
+
+    def on_job_loaded(self, job):
+        """ Fills in the profiles once the model has loaded a job. """
         if job is not None:
-            self.current_job_path = os.path.join(self.jobs_dir, job)
-            self.configReader = config_reader.ConfigReader(self.current_job_path)
             self.path_label.setText(self.current_job_path)
+            self.update_file_index()
 
             # check software support for current job
-            if self.configReader.check_software_support(self.software):
-                self.extensions = self.get_extensions()
+            if self.model.is_supported():
+                self.model.extensions = self.get_extensions()
                 self.populate_profiles()
             else:
                 self.clear_window()
@@ -245,19 +385,16 @@ class Navigator(QtGuiWidgets.QDialog):
         """ Empties everything in the window """
         self.token_obj_dict.clear()
         self.profile_combo.clear()
-        self.template = ""
         self.create_token_grid([])
 
     def on_profile_change(self, profile):
         """Called whnever the profile combo box is changed"""
-        self.template = self.configReader.get_profile_template(self.software, profile)
-        token_list = self.configReader.get_tokens(self.template)
-        self.create_token_grid(token_list)
+        self.model.set_profile(profile)
 
     def create_token_grid(self, token_list):
         """Create the grid layout of tokens plus the file list that makes the body of the window"""
+        self.scanner.cancel_group('token')
         self.token_obj_dict.clear()
-        self.populate_file()
 
         for token in token_list:
             token_obj = Token(self, token)
@@ -280,29 +417,105 @@ class Navigator(QtGuiWidgets.QDialog):
         self.token_grid.addWidget(self.file_label, 0, len(token_list))
         self.token_grid.addWidget(self.file_tree_widget, 1, len(token_list))
         self.token_grid.addWidget(self.file_line_edit, 2, len(token_list))
+        self.token_grid.addWidget(self.version_check, 3, len(token_list))
         self.token_grid.setColumnStretch(len(token_list), 3)
 
-        if len(self.token_obj_dict) > 0:
-            self.populate_token(self.token_obj_dict.keys()[0])
+        self.schedule_cascade(0)
 
     def on_token_change(self, token, text):
         """Called whenever a token's list widget is changed."""
+        self.model.set_token(token, text)
 
+    def on_token_set(self, token):
+        """ Updates the columns after a token once the model has set its value. """
+        text = self.model.get_token(token)
         if text:
-            currentPath = self.configReader.get_path(
-                self.template, self.get_token_dict(), token)
-            self.path_label.setText(os.path.join(
-                currentPath, self.token_obj_dict[token].get_current()))
+            self.set_token_path_label(token)
+            # The next column is listed once the cascade resolves, start reading it now
+            self.prefetch_next(('prefetch', 'selection'), token, text)
 
         self.execute_button.setEnabled(False)
         index = self.token_obj_dict.keys().index(token)
 
-        if (len(self.token_obj_dict) > index+1):
-            next_token = self.token_obj_dict.keys()[index+1]
-            self.populate_token(next_token)
+        # The model cleared the selections of the following tokens
+        for later_token in self.token_obj_dict.keys()[index+1:]:
+            self.token_obj_dict[later_token].clear_list()
+        self.schedule_cascade(index+1)
 
+    def on_tokens_set(self):
+        """ Selects the token values the model was given, such as a recent selection. """
+        for token, token_obj in self.token_obj_dict.iteritems():
+            token_obj.select(self.model.get_token(token))
+        token_dict = self.get_token_dict()
+        set_tokens = [token for token in self.token_obj_dict if token in token_dict]
+        if set_tokens:
+            self.set_token_path_label(set_tokens[-1])
+        self.schedule_cascade(0)
+
+    def set_token_path_label(self, token):
+        """ Shows the path of the selected folder of a token. """
+        currentPath = self.model.get_token_path(token)
+        self.path_label.setText(os.path.join(currentPath, self.model.get_token(token)))
+
+    def schedule_cascade(self, index=0):
+        """ Marks the token columns from index on and the file list as out of date. They are 
+        listed once the selection has settled for CASCADE_DELAY, so a run of changes only 
+        lists the folders of the final selection.
+        """
+        if self.cascade_index is None or index < self.cascade_index:
+            self.cascade_index = index
+        # Anything still being listed for those columns is stale
+        for token in self.token_obj_dict.keys()[index:]:
+            self.scanner.cancel(('token', token))
+        self.scanner.cancel_group('files')
+        self.cascade_timer.start()
+
+    def resolve_cascade(self):
+        """ Lists the folders of every out of date token column and the file list. """
+        if self.default_job_pending:
+            self.default_job_pending = False
+            if self.is_current_job_listed():
+                self.setComboBox(self.job_combo, os.path.basename(self.current_job_path))
+            elif self.job_combo.count() > 0:
+                self.on_job_change(self.job_combo.itemText(0))
+            else:
+                self.on_job_change(None)
+
+        index = self.cascade_index
+        self.cascade_index = None
+        if index is None:
+            return
+        # Columns whose previous token is set are listed together, selections that are
+        # already known (such as recents) are restored as the lists arrive
+        for token in self.token_obj_dict.keys()[index:]:
+            self.populate_token(token)
         self.populate_file()
 
+    def on_token_hover(self, token, text):
+        """ Called when the mouse enters an item of a token's list widget. """
+        self.prefetch_next(('prefetch', 'hover'), token, text)
+
+    def prefetch_next(self, channel, token, text):
+        """ Lists the folder that selecting text in a token column shows next into the
+        listing cache, so it's ready when populate_token or populate_file asks for it.
+        """
+        if not text or not self.model.is_supported() or token not in self.token_obj_dict:
+            return
+        # The file folder is listed with mtimes
+        path, with_mtime = self.model.get_next_path(token, text)
+        self.scanner.scan(channel, dir_scanner.prefetch_directories, ([path], with_mtime),
+            priority=dir_scanner.PREFETCH_PRIORITY)
+
+    def prefetch_recents(self):
+        """ Lists the folders of the recent selections into the listing cache. """
+        try:
+            recents_list = self.read_local_config()[self.software]
+        except:
+            return
+        if isinstance(recents_list, list) and recents_list:
+            self.scanner.scan(('prefetch', 'recents'), dir_scanner.prefetch_recents,
+                (recents_list,), priority=dir_scanner.PREFETCH_PRIORITY)
+
     def on_token_button(self, token):
         """Called when a token object's 'new' button is clicked."""
         new_token, ok = QtGuiWidgets.QInputDialog.getText(self, "Create Token", (
@@ -316,132 +529,90 @@ class Navigator(QtGuiWidgets.QDialog):
         """Returns a sorted list of directories in a given directory with an optional 
         flag to reverse the order.
         """
-        try:
-            dirs = [name for name in os.listdir(directory)
-                    if os.path.isdir(os.path.join(directory, name))]
-        except:
-            return []
-        return sorted(dirs, reverse=reverse)
+        return dir_listing.list_dir_names(directory, files=False, reverse=reverse)
 
     def getFileList(self, directory, extensions=[], reverse=False):
         """Returns a sorted list of files with a given extension in a given directory with 
         an optional flag to reverse the order.
         """
-        try:
-            if extensions:
-                files = [name for name in os.listdir(directory)
-                        if (not os.path.isdir(os.path.join(directory, name))) 
-                        & name.lower().endswith(tuple(extensions))]
-            else:
-                files = [name for name in os.listdir(directory)
-                        if (not os.path.isdir(os.path.join(directory, name)))]
-
-        except:
-            return []
-        return sorted(files, reverse=reverse)
+        return dir_listing.list_dir_names(
+            directory, dirs=False, extensions=extensions, reverse=reverse)
 
     def populate_token(self, token):
-        """Populates a token's list widget."""
-        previous_token_index = self.token_obj_dict.keys().index(token)-1
-        previous_token_obj = self.token_obj_dict.values()[previous_token_index]
+        """Populates a token's list widget. The folder is scanned in the background."""
         token_obj = self.token_obj_dict[token]
 
-        # Populate the next token if the previous one has a selection or it's the first one
-        if previous_token_obj.get_current() or previous_token_index <= 0:
-            token_dict = self.get_token_dict()
-            populate_path = self.configReader.get_path(
-                self.template, self.get_token_dict(), token)
-
-            folderList = self.getDirList(populate_path)
-            excludeList = self.configReader.get_excludes(token)
-
-            # Remove any occurances of excludeList from folderList
-            folderList = [x for x in folderList if x not in excludeList]
-
-            # Remove template folder from list
-            tokenFolder = ".[" + token + "]"
-            if tokenFolder in folderList:
-                folderList.remove(tokenFolder)
-
-            token_obj.set_list(folderList)
+        # Populate the token if the previous one has a selection or it's the first one
+        if self.model.is_token_ready(token):
+            populate_path = self.model.get_token_path(token)
+            token_obj.clear_list()
+            self.scanner.scan(('token', token), dir_scanner.scan_directories, (populate_path,),
+                on_chunk=lambda folderList: self.on_token_scanned(token, folderList))
         else:
-            token_obj.clear()
+            self.scanner.cancel(('token', token))
+            token_obj.clear_list()
+            self.model.set_token(token, None)
+
+    def on_token_scanned(self, token, folderList):
+        """ Fills a token's list widget once its folder is scanned. """
+        token_obj = self.token_obj_dict.get(token)
+        if token_obj is None:
+            return
+        token_obj.set_list(self.model.filter_token_values(token, folderList))
 
     def populate_file(self):
         """Populates the file list widget based on the previous tokens."""
-
-        self.file_tree_widget.clear()
-        # print("Let's build this!")
-        try:
-            token_dict = self.get_token_dict()
-            populate_path = self.configReader.get_path(self.template, token_dict)
-            self.build_file_tree(populate_path, self.file_tree_widget)
-        except:
-            pass
-
-        # TODO: Auto select most recent item
-        # self.file_list_widget.clear()
-        # try:
-        # 	token_dict = self.get_token_dict()
-        # 	populatePath = self.configReader.get_path(self.template, token_dict)
-        # 	file_list = self.getFileList(populatePath, self.extensions)
-        # except:
-        # 	file_list = []
-        # # self.current_software_tools.debug_msg("Trying to pupulate file box at this location: " + str(populatePath))
-        # if len(file_list) > 0:
-        # 	for index, file in enumerate(file_list):
-        # 		current_item = QtGuiWidgets.QListWidgetItem(file, self.file_list_widget)
-        # 		# Set to latest version
-        # 		if (index+1 >= len(file_list)):
-        # 			self.file_list_widget.setCurrentItem(current_item)
-        # 			self.on_file_change(file)
-        # 		else:
-        # 			self.on_file_change("")
-
-    def on_file_expand(self, item):
-        """ Clears everything currently in the tree under the givent tree item and 
-        builds a new tree under it.
+        populate_path = self.model.get_file_dir()
+        # Nothing to list until every token is selected
+        if populate_path is None:
+            self.file_model.clear()
+        else:
+            # If self.extensions is not empty, list only files that end in those extensions
+            self.file_model.set_root(populate_path, self.extensions)
+
+    def on_files_loaded(self, index):
+        """ Selects the newest file once the file list arrives when versions are grouped. """
+        if index.isValid():
+            return
+        if self.pending_file is not None:
+            self.select_pending_file()
+            return
+        if not self.file_model.group_versions:
+            return
+        latest = self.file_model.latest_index()
+        if latest.isValid():
+            self.file_tree_widget.setCurrentIndex(latest)
+
+    def select_pending_file(self):
+        """ Selects the file a quick open result pointed to. Files in sub folders are typed 
+        into the file line instead.
         """
-        for i in reversed(range(item.childCount())):
-            item.removeChild(item.child(i))
-        path = item.text(2)
-        self.build_file_tree(path, item)
-
-    def build_file_tree(self, path, tree):
-        """ Finds all files and folders in the given path and adds it to the tree 
-        under the given tree item 
+        path = self.pending_file
+        self.pending_file = None
+        index = self.file_model.find_index(path)
+        if index.isValid():
+            self.file_tree_widget.setCurrentIndex(index)
+            self.file_tree_widget.scrollTo(index)
+            return
+        token_path = self.model.get_file_dir()
+        rel_path = os.path.relpath(path, token_path)
+        self.file_line_edit.setText(rel_path)
+        self.on_file_line_change(rel_path)
+
+    def on_file_expand(self, index):
+        """ Lists the expanded folder again so the tree picks up any changes. Folders being
+        expanded for the first time are listed by the model itself.
         """
-        # If self.extensions is not empty, search only for files that end in those extensions, otherwise list everything
-        if self.extensions:
-            list_dir = [name for name in os.listdir(path) if os.path.isdir(
-                os.path.join(path, name)) or name.lower().endswith(tuple(self.extensions))]
-        else:
-            list_dir = os.listdir(path)
-
-        for element in list_dir:
-            path_info = os.path.join(path, element)
-            date = time.strftime('%m/%d/%y %H:%M',  time.localtime(os.path.getmtime(path_info)))
-            parent_itm = QtGuiWidgets.QTreeWidgetItem(tree, [os.path.basename(element),date])
-            parent_itm.setData(2, QtCore.Qt.EditRole, path_info)
-            if os.path.isdir(path_info):
-                parent_itm.setChildIndicatorPolicy(QtGuiWidgets.QTreeWidgetItem.ShowIndicator)
-                # Activate the following line in order to recursively build the whole tree
-                # self.build_file_tree(path_info, parent_itm)
-            else:
-                fileInfo = QtCore.QFileInfo(path_info)
-                iconProvider = QtGuiWidgets.QFileIconProvider()
-                icon = iconProvider.icon(fileInfo)
-                parent_itm.setIcon(0, icon)
+        self.file_model.refresh(index)
 
-    def on_file_change(self, item):
-        """Called when the file tree widget is changed."""
+    def on_file_change(self, index, previous=None):
+        """Called when the current index of the file tree changes."""
 
         self.file_line_edit.clear()
-        if item:
-            item.setSelected(True)
-            path = item.text(2)
+        if index.isValid():
+            path = self.file_model.file_path(index)
             file_name = os.path.basename(path)
-            token_path = self.configReader.get_path(self.template, self.get_token_dict())
+            token_path = self.model.get_file_dir()
             rel_path = os.path.relpath(path, token_path)
             # rel_path = path.replace(token_path, '')
             # print("rel path: " + rel_path)
@@ -460,7 +631,7 @@ class Navigator(QtGuiWidgets.QDialog):
         """Called when the file line is changed."""
 
         if file:
-            currentPath = self.configReader.get_path(self.template, self.get_token_dict())
+            self.model.set_file(self.file_line_edit.text())
 
             # extended_path=''
 
@@ -468,21 +639,19 @@ class Navigator(QtGuiWidgets.QDialog):
             # 	extended_path = self.file_tree_widget.currentItem().text(2)
             # selected = self.file_tree_widget.currentItem().isSelected()
             # print("extended path: " + extended_path + str(selected))
-            self.finalPath = os.path.join(currentPath, self.file_line_edit.text())
-            self.path_label.setText(self.finalPath)
-            if not os.path.isdir(self.finalPath):
-                self.execute_button.setEnabled(True)
-            else:
+            self.finalPath = self.model.get_final_path()
+            # There's no final path until every token has a value
+            if self.finalPath is None:
+                self.finalPath = ""
+                self.path_label.clear()
                 self.execute_button.setEnabled(False)
+            else:
+                self.path_label.setText(self.finalPath)
+                self.execute_button.setEnabled(not os.path.isdir(self.finalPath))
 
     def get_token_dict(self):
-        """Get a dictionary of tokens from the dictionary of token objects."""
-        token_dict = dict()
-        for token_obj in self.token_obj_dict:
-            token_value = self.token_obj_dict[token_obj].get_current()
-            if token_value is not None:
-                token_dict[token_obj] = token_value
-        return token_dict
+        """Get a dictionary of the tokens that have a value."""
+        return self.model.get_token_dict()
     
     def set_list_widget(self, list_widget, item_name):
         for i in range(list_widget.count()):
@@ -503,12 +672,16 @@ class Navigator(QtGuiWidgets.QDialog):
         localConfig = None
         try:
             with open(LOCAL_CONFIG_PATH, 'r') as stream:
-                localConfig = yaml.safe_load(stream) or {}
+                localConfig = config_reader.load_yaml(stream) or {}
         except IOError:
             open(LOCAL_CONFIG_PATH, 'w')
             localConfig = {}
         return localConfig
 
+    def write_local_config(self, localConfig):
+        with open(LOCAL_CONFIG_PATH, 'w') as outfile:
+            yaml.dump(localConfig, outfile, default_flow_style=False)
+
     def load_recents(self, index=0, read_local_config=False):
         """Tries to load the project from the environment variables and falls back 
         on local config unless read_local_config is explicitly set.
@@ -530,21 +703,66 @@ class Navigator(QtGuiWidgets.QDialog):
                 pass
             
         if softwareRecents:
-            self.jobs_dir = softwareRecents["jobs_dir"]
-            self.jobs_dir_label.setText(self.jobs_dir)
+            self.apply_selection(softwareRecents["jobs_dir"], softwareRecents["job"], 
+                softwareRecents["profile"], softwareRecents["tokens"])
+
+    def apply_selection(self, jobs_dir, job, profile, tokens):
+        """ Selects a job, profile and token values. The folders are listed once the cascade 
+        resolves and the values are selected as the lists arrive.
+        """
+        if jobs_dir != self.jobs_dir or os.path.join(jobs_dir, job) != self.current_job_path:
+            self.model.set_jobs_dir(jobs_dir)
+            # Load the job before listing the jobs so the first job is never loaded
+            self.on_job_change(job)
             self.populate_jobs()
-            self.setComboBox(self.job_combo, softwareRecents["job"])
-            self.on_job_change(softwareRecents["job"])
-
-            self.setComboBox(self.profile_combo, softwareRecents["profile"])
-            self.on_profile_change(softwareRecents["profile"])
-            recentsTokens = softwareRecents["tokens"]
-            for token, token_obj in self.token_obj_dict.iteritems():
-                #self.setComboBox(self.tokenComboDict[token], recentsTokens[token])
-                self.set_list_widget(token_obj.list_widget, recentsTokens[token])
-                self.on_token_change(token, recentsTokens[token])
-                # self.setComboBox(self.tokenComboDict[token], recentsTokens[token])
-                # self.onTokenChange(recentsTokens[token], self.tokenComboDict[token])
+
+        self.setComboBox(self.profile_combo, profile)
+        self.on_profile_change(profile)
+        self.model.set_tokens(tokens)
+
+    def update_file_index(self):
+        """ Refreshes the quick open index of the current job in the background. """
+        self.index_cancelled.set()
+        self.index_cancelled = threading.Event()
+        if self.file_index is not None:
+            self.file_index.close()
+            self.file_index = None
+        self.scanner.scan(('index', None), file_index.update_index, 
+            (self.current_job_path, self.index_cancelled))
+
+    def search_files(self, query):
+        """ Returns the quick open results of the current job for the query. """
+        if not self.current_job_path:
+            return []
+        try:
+            if self.file_index is None:
+                self.file_index = file_index.FileIndex(self.current_job_path, read_only=True)
+            return self.file_index.search(query, self.software, self.extensions)
+        except file_index.sqlite3.Error:
+            return []
+
+    def on_quick_open_search(self):
+        results = self.search_files(self.quick_open_edit.text())
+        self.search_results = dict()
+        labels = []
+        for result in results:
+            label = os.path.relpath(result['path'], self.current_job_path)
+            self.search_results[label] = result
+            labels.append(label)
+        self.quick_open_model.setStringList(labels)
+        if labels:
+            self.quick_open_completer.complete()
+
+    def on_quick_open_activated(self, label):
+        result = self.search_results.get(label)
+        if result is not None:
+            self.open_search_result(result)
+
+    def open_search_result(self, result):
+        """ Selects the profile and tokens of a quick open result and then its file. """
+        self.pending_file = result['path']
+        self.apply_selection(self.jobs_dir, os.path.basename(self.current_job_path), 
+            result['profile'], result['tokens'])
 
     def save_recents(self, write_local_config=False):
         """Saves the project to the software's local config."""
@@ -560,6 +778,11 @@ class Navigator(QtGuiWidgets.QDialog):
 
         for recent, value in recentOption.iteritems():
             os.environ[recent] = str(value)
+
+        # Stored so the recents combo and prefetch don't need the job's config
+        recentOption["label"] = get_recent_label(
+            recentOption["job"], [str(token) for token in self.token_obj_dict], tokenDict)
+        recentOption["paths"] = [str(path) for path in self.model.get_selection_paths()]
         
         os.environ['software'] = str(self.software)
 
@@ -576,15 +799,23 @@ class Navigator(QtGuiWidgets.QDialog):
             recents_list=[]
 
         # If it already exists in the list, remove it
-        if recentOption in recents_list: recents_list.remove(recentOption)
+        recents_list = [recent for recent in recents_list
+                        if not is_same_recent(recent, recentOption)]
         # Add to the beginning of the list
         recents_list.insert(0, recentOption)
         # Restrict list length to 10
         recents_list = recents_list[:10]
         
         newConfig[self.software] = recents_list
-        with open(LOCAL_CONFIG_PATH, 'w') as outfile:
-            yaml.dump(newConfig, outfile, default_flow_style=False)
+        self.write_local_config(newConfig)
+
+    def closeEvent(self, event):
+        self.scanner.cancel_all()
+        self.index_cancelled.set()
+        if self.file_index is not None:
+            self.file_index.close()
+            self.file_index = None
+        super(Navigator, self).closeEvent(event)
 
     def path_label_click(self, click_event):
         path = self.path_label.text()
@@ -604,11 +835,13 @@ class Token():
     def __init__(self, parent, token):
         self.parent = parent
         self.token = token
-        self.current_text = None
         tokenString = token.lower().capitalize()
         self.label = QtGuiWidgets.QLabel(tokenString)
         self.list_widget = QtGuiWidgets.QListWidget()
         self.list_widget.currentTextChanged.connect(self.on_token_change)
+        # Hovered folders are prefetched, itemEntered needs mouse tracking
+        self.list_widget.setMouseTracking(True)
+        self.list_widget.itemEntered.connect(self.on_token_hover)
         self.add_button = QtGuiWidgets.QPushButton("New " + tokenString)
         self.add_button.clicked.connect(self.on_token_button)
 
@@ -616,22 +849,48 @@ class Token():
         return "Token Obj:\nParent: " + str(self.parent) + " token: " + str(self.token)
 
     def on_token_change(self, text):
-        self.current_text = text
         self.parent.on_token_change(self.token, text)
 
+    def on_token_hover(self, item):
+        self.parent.on_token_hover(self.token, item.text())
+
     def on_token_button(self):
         self.parent.on_token_button(self.token)
 
     def set_list(self, options_list):
+        """ Fills the list. The current value stays selected, if it's no longer in the list 
+        it's cleared.
+        """
+        current_text = self.get_current()
+        self.list_widget.blockSignals(True)
         self.list_widget.clear()
         for element in options_list:
             QtGuiWidgets.QListWidgetItem(element, self.list_widget)
-
-    def clear(self):
+        found = (current_text is None 
+                 or self.parent.set_list_widget(self.list_widget, current_text))
+        self.list_widget.blockSignals(False)
+        if not found:
+            self.parent.on_token_change(self.token, None)
+
+    def select(self, text):
+        """ Selects the given text if it's in the list, set_list selects the current value 
+        once the list arrives.
+        """
+        self.list_widget.blockSignals(True)
+        if not text or not self.parent.set_list_widget(self.list_widget, text):
+            self.list_widget.setCurrentRow(-1)
+        self.list_widget.blockSignals(False)
+
+    def clear_list(self):
+        """ Empties the list, the value stays in the model so it's selected again by 
+        set_list.
+        """
+        self.list_widget.blockSignals(True)
         self.list_widget.clear()
+        self.list_widget.blockSignals(False)
 
     def get_current(self):
-        return self.current_text
+        return self.parent.model.get_token(self.token)
 
 # Debugging -----------------------------------------------
 if __name__== '__main__':
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import sys
+import time
+import argparse
+
+import config_reader
+import dir_listing
+import navigator_model
+
+# Constants
+from pipeline_config import DEFAULT_JOBS_DIR
+
+BENCHMARK_RUNS = 5
+
+
+def parse_tokens(pairs):
+    """ Returns a dictionary of tokens from a list of "token=value" strings. """
+    tokenDict = dict()
+    for pair in pairs:
+        token, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError("Tokens are given as token=value, not " + pair)
+        tokenDict[token] = value
+    return tokenDict
+
+def check_selection(model, job, profile=None):
+    """ Loads job and raises ValueError if it isn't in the jobs dir, doesn't include the
+    software or has no such profile.
+    """
+    if job not in model.list_jobs():
+        raise ValueError(job + " isn't a job in " + model.jobs_dir)
+    model.set_job(job)
+    if not model.is_supported():
+        raise ValueError(job + " doesn't include " + model.software)
+    if profile is not None and profile not in model.get_profiles():
+        raise ValueError(job + " has no " + profile + " profile for " + model.software)
+
+def navigate(model, job, profile, tokenDict):
+    """ Selects as much of the given selection as exists, in the order the Navigator dialog
+    does. Raises ValueError if the job or the profile can't be selected.
+    """
+    if job is None:
+        return
+    check_selection(model, job, profile)
+    if profile is None:
+        return
+    model.set_profile(profile)
+    for token in model.tokens:
+        if not tokenDict.get(token):
+            break
+        model.set_token(token, tokenDict[token])
+
+def list_next(model):
+    """ Returns a tuple of what the selection needs next and the options for it, the jobs,
+    the profiles, the values of the first token without one or the files.
+    """
+    if model.job is None:
+        return "job", model.list_jobs()
+    if model.profile is None:
+        return "profile", sorted(model.get_profiles())
+    for token in model.tokens:
+        if not model.get_token(token):
+            return token, model.list_token(token)
+    return "file", [entry.name for entry in model.list_files()]
+
+def timed(timings, step, function, *args):
+    start = time.time()
+    result = function(*args)
+    timings.append((step, time.time() - start))
+    return result
+
+def benchmark(model, job, profile, tokenDict, runs=BENCHMARK_RUNS, cold=True):
+    """ Times each step of navigating to a selection. Returns a list of (step, seconds)
+    averaged over the runs. Cold runs drop the listings and configs cached in this
+    process before each run, like a new dialog. Raises ValueError if the job or the
+    profile can't be selected.
+    """
+    check_selection(model, job, profile)
+    totals = []
+    for run in range(runs):
+        if cold:
+            dir_listing.invalidate()
+            config_reader.clear_config_readers()
+        timings = []
+        timed(timings, "list jobs", model.list_jobs)
+        timed(timings, "load job", model.set_job, job)
+        timed(timings, "set profile", model.set_profile, profile)
+        for token in model.tokens:
+            timed(timings, "list " + token, model.list_token, token)
+            if not tokenDict.get(token):
+                break
+            timed(timings, "set " + token, model.set_token, token, tokenDict[token])
+        else:
+            timed(timings, "list files", model.list_files)
+
+        if not totals:
+            totals = [[step, 0.0] for step, _ in timings]
+        for total, (_, seconds) in zip(totals, timings):
+            total[1] += seconds
+    return [(step, seconds / runs) for step, seconds in totals]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Lists what comes next in the navigation of a job, or times each step "
+                    "of the navigation.")
+    parser.add_argument("software")
+    parser.add_argument("--jobs-dir", default=DEFAULT_JOBS_DIR)
+    parser.add_argument("--job")
+    parser.add_argument("--profile")
+    parser.add_argument("-t", "--token", action="append", default=[], metavar="TOKEN=VALUE",
+                        dest="tokens", help="A token value, can be given several times")
+    parser.add_argument("--file", help="Print the final path of this file")
+    parser.add_argument("--benchmark", type=int, metavar="RUNS", nargs="?",
+                        const=BENCHMARK_RUNS, help="Time each step of the navigation")
+    parser.add_argument("--warm", action="store_true",
+                        help="Keep the caches between benchmark runs")
+    args = parser.parse_args(argv)
+
+    try:
+        tokenDict = parse_tokens(args.tokens)
+    except ValueError as exc:
+        parser.error(str(exc))
+    model = navigator_model.NavigatorModel(args.software, jobs_dir=args.jobs_dir)
+
+    if args.benchmark:
+        if args.job is None or args.profile is None:
+            parser.error("--benchmark needs a --job and a --profile")
+        try:
+            results = benchmark(model, args.job, args.profile, tokenDict, args.benchmark,
+                                cold=not args.warm)
+        except ValueError as exc:
+            sys.stderr.write(str(exc) + "\n")
+            return 1
+        for step, seconds in results:
+            print("%-24s %9.2f ms" % (step, seconds * 1000))
+        print("%-24s %9.2f ms" % ("total", sum(seconds for _, seconds in results) * 1000))
+        return 0
+
+    try:
+        navigate(model, args.job, args.profile, tokenDict)
+    except ValueError as exc:
+        sys.stderr.write(str(exc) + "\n")
+        return 1
+    if args.file:
+        model.set_file(args.file)
+        final_path = model.get_final_path()
+        if final_path is None:
+            sys.stderr.write("Every token needs a value for the final path\n")
+            return 1
+        print(final_path)
+        return 0
+    step, options = list_next(model)
+    print(step + ":")
+    for option in options:
+        print("    " + option)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
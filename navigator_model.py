@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+
+import config_reader
+import dir_listing
+import job_index
+import path_template
+
+# Constants
+from pipeline_config import DEFAULT_JOBS_DIR
+from pipeline_config import CONFIG_FILE_NAME
+
+
+def get_selection_paths(configReader, template, tokenDict):
+    """ Returns the folders listed to show a selection, the folder of each token and then
+    the file folder, up to the first that still needs a value.
+    """
+    paths = [configReader.get_path(template, dict(tokenDict), token)
+             for token in configReader.get_tokens(template)]
+    paths.append(configReader.get_path(template, dict(tokenDict)))
+    return [path for path in paths if path_template.TOKEN_START not in path]
+
+
+class NavigatorModel(object):
+    """Navigation state of a launcher without any UI. A jobs dir, a job in it, one of the
+    job's profiles, a value for each token of the profile's template and a file name
+    make the final path.
+
+    Every change is sent to the subscribers as callback(event, value):
+
+    - 'jobs_dir' with the new jobs dir
+    - 'job' with the new job, the profile is cleared
+    - 'profile' with the new profile, the token values are cleared
+    - 'token' with the token whose value changed, the values after it are cleared
+    - 'tokens' with None once set_tokens has set several values
+    - 'file' with the new file name
+
+    The list functions only read the file system and never change the state, so the
+    Navigator dialog runs them on its scanner threads and the CLI calls them directly.
+    """
+
+    def __init__(self, software, extensions=None, jobs_dir=DEFAULT_JOBS_DIR):
+        self.software = software
+        # Files are only listed if they end in one of these, they're replaced by the
+        # extensions in the job's config when a job is set
+        self.extensions = list(extensions or [])
+        self.jobs_dir = jobs_dir
+        self.job = None
+        self.job_path = ""
+        self.configReader = None
+        self.profile = None
+        self.template = ""
+        self.tokens = []
+        self.values = dict()
+        self.file_name = ""
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def notify(self, event, value):
+        for callback in list(self.subscribers):
+            callback(event, value)
+
+    # Jobs ---------------------------------------------------------------------------------
+
+    def set_jobs_dir(self, jobs_dir):
+        self.jobs_dir = jobs_dir
+        self.notify('jobs_dir', jobs_dir)
+
+    def list_jobs(self):
+        """ Returns the sorted names of the jobs in the jobs dir. """
+        return job_index.get_jobs(self.jobs_dir, CONFIG_FILE_NAME)
+
+    def set_job(self, job):
+        """ Loads the config of a job in the jobs dir, or unloads the job if it's None. """
+        self.job = job
+        if job is None:
+            self.job_path = ""
+            self.configReader = None
+        else:
+            self.job_path = os.path.join(self.jobs_dir, job)
+            self.configReader = config_reader.get_config_reader(self.job_path)
+            if self.is_supported():
+                self.extensions = self.configReader.get_extensions(self.software)
+        self.clear_profile()
+        self.notify('job', job)
+
+    def is_supported(self):
+        """ Returns true if a job is loaded and its config includes the software. """
+        return (self.configReader is not None
+                and self.configReader.check_software_support(self.software))
+
+    # Profiles -----------------------------------------------------------------------------
+
+    def get_profiles(self):
+        if not self.is_supported():
+            return []
+        return list(self.configReader.get_launcher_profiles(self.software).keys())
+
+    def set_profile(self, profile):
+        """ Sets the profile whose template the tokens come from, None clears it. """
+        if profile and self.is_supported():
+            self.profile = profile
+            self.template = self.configReader.get_profile_template(self.software, profile)
+            self.tokens = list(self.configReader.get_tokens(self.template))
+            self.values = dict()
+            self.file_name = ""
+        else:
+            self.clear_profile()
+        self.notify('profile', self.profile)
+
+    def clear_profile(self):
+        self.profile = None
+        self.template = ""
+        self.tokens = []
+        self.values = dict()
+        self.file_name = ""
+
+    # Tokens -------------------------------------------------------------------------------
+
+    def get_token(self, token):
+        return self.values.get(token)
+
+    def get_token_dict(self):
+        """ Returns a dictionary of the tokens that have a value. """
+        return dict((token, self.values[token]) for token in self.tokens
+                    if self.values.get(token))
+
+    def set_token(self, token, value):
+        """ Sets the value of a token, an empty value clears it. The values of the tokens
+        after it don't exist under the new value so they're cleared. Returns false if
+        nothing changed.
+        """
+        index = self.tokens.index(token)
+        later_tokens = [later for later in self.tokens[index+1:] if later in self.values]
+        if (value or None) == self.values.get(token) and not later_tokens:
+            return False
+        if value:
+            self.values[token] = value
+        else:
+            self.values.pop(token, None)
+        for later_token in later_tokens:
+            del self.values[later_token]
+        self.file_name = ""
+        self.notify('token', token)
+        return True
+
+    def set_tokens(self, tokenDict):
+        """ Sets the values of every token in tokenDict, such as a recent selection. """
+        self.values = dict((token, tokenDict[token]) for token in self.tokens
+                           if tokenDict.get(token))
+        self.file_name = ""
+        self.notify('tokens', None)
+
+    def is_token_ready(self, token):
+        """ Returns true if a token's column can be listed, it's the first token or the
+        previous one has a value.
+        """
+        index = self.tokens.index(token)
+        return index == 0 or bool(self.values.get(self.tokens[index-1]))
+
+    def get_token_path(self, token, tokenDict=None):
+        """ Returns the folder whose sub folders are the values of a token. """
+        if tokenDict is None:
+            tokenDict = self.get_token_dict()
+        return self.configReader.get_path(self.template, dict(tokenDict), token)
+
+    def filter_token_values(self, token, folderList):
+        """ Returns the folder names that can be values of a token. """
+        excludeList = self.configReader.get_excludes(token)
+        # Template folders are never values
+        tokenFolder = ".[" + token + "]"
+        return [folder for folder in folderList
+                if folder not in excludeList and folder != tokenFolder]
+
+    def list_token(self, token):
+        """ Returns the sorted values a token can take under the current values. """
+        folderList = dir_listing.list_dir_names(self.get_token_path(token), files=False)
+        return self.filter_token_values(token, folderList)
+
+    def get_next_path(self, token, value):
+        """ Returns a tuple of the folder listed next if a token was set to value and
+        whether it's the file folder.
+        """
+        index = self.tokens.index(token)
+        tokenDict = dict((earlier, self.values[earlier]) for earlier in self.tokens[:index]
+                         if self.values.get(earlier))
+        tokenDict[token] = value
+        if index + 1 < len(self.tokens):
+            return self.get_token_path(self.tokens[index+1], tokenDict), False
+        return self.configReader.get_path(self.template, tokenDict), True
+
+    # Files --------------------------------------------------------------------------------
+
+    def get_file_dir(self):
+        """ Returns the folder the files are listed from, or None until every token of
+        the template has a value.
+        """
+        if self.configReader is None or not self.template:
+            return None
+        path = self.configReader.get_path(self.template, self.get_token_dict())
+        if path_template.TOKEN_START in path:
+            return None
+        return path
+
+    def list_files(self):
+        """ Returns a list of DirEntry, with mtimes, for the files and sub folders in the
+        file folder sorted by name. Only files ending in the extensions are listed.
+        """
+        path = self.get_file_dir()
+        if path is None:
+            return []
+        try:
+            entries = dir_listing.cached_list_dir(
+                path, extensions=self.extensions, with_mtime=True)
+        except OSError:
+            return []
+        return sorted(entries, key=lambda entry: entry.name)
+
+    def set_file(self, file_name):
+        """ Sets the file name, relative to the file folder. """
+        self.file_name = file_name or ""
+        self.notify('file', self.file_name)
+
+    def get_final_path(self):
+        """ Returns the path of the file, or None if the file folder isn't known yet. """
+        path = self.get_file_dir()
+        if path is None or not self.file_name:
+            return None
+        return os.path.join(path, self.file_name)
+
+    # Selections ---------------------------------------------------------------------------
+
+    def get_selection_paths(self):
+        """ Returns the folders listed to show the current selection, see
+        get_selection_paths.
+        """
+        if self.configReader is None or not self.template:
+            return []
+        return get_selection_paths(self.configReader, self.template, self.get_token_dict())
+
+    def select(self, jobs_dir, job, profile, tokenDict, file_name=None):
+        """ Sets everything at once, such as a recent selection. Returns false if the job
+        doesn't include the software.
+        """
+        if jobs_dir != self.jobs_dir:
+            self.set_jobs_dir(jobs_dir)
+        if job != self.job or not self.job_path:
+            self.set_job(job)
+        if not self.is_supported():
+            return False
+        self.set_profile(profile)
+        self.set_tokens(tokenDict)
+        if file_name:
+            self.set_file(file_name)
+        return True
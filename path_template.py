@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import re
+
+TOKEN_START = "<"
+TOKEN_END = ">"
+
+# Compiled templates are shared by every ConfigReader in the process
+_TEMPLATE_CACHE = dict()
+_TEMPLATE_CACHE_LIMIT = 4096
+
+# Windows paths are matched regardless of case
+CASE_INSENSITIVE = os.name == 'nt'
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class Template(object):
+    """A template string parsed once into literal and token segments.
+
+    segments is a list of (literal, token) pairs where token is None for the
+    trailing literal. Rendering is a single pass over the segments.
+    """
+    __slots__ = ('source', 'segments', 'tokens', '_prefixes')
+
+    def __init__(self, source, segments=None):
+        self.source = source
+        self.segments = parse(source) if segments is None else segments
+        self.tokens = [token for _, token in self.segments if token is not None]
+        self._prefixes = None
+
+    def prefix(self, token):
+        """ Returns the template up to the first occurrence of token, or None if the token 
+        isn't in the template. The prefixes of every token are built on the first call.
+        """
+        if self._prefixes is None:
+            prefixes = dict()
+            source = ""
+            for index, (literal, segmentToken) in enumerate(self.segments):
+                source += literal
+                if segmentToken is None:
+                    break
+                if segmentToken not in prefixes:
+                    prefixes[segmentToken] = Template(
+                        source, self.segments[:index] + [(literal, None)])
+                source += TOKEN_START + segmentToken + TOKEN_END
+            self._prefixes = prefixes
+        return self._prefixes.get(token)
+
+    def __repr__(self):
+        return "Template(%r)" % self.source
+
+    def render(self, tokenDict, defaults=None, _stack=()):
+        """ Returns the template with every non-empty token from tokenDict (or defaults)
+        replaced. Tokens inside of token values are expanded recursively. Missing tokens
+        are left in place.
+        """
+        parts = []
+        for literal, token in self.segments:
+            if literal:
+                parts.append(literal)
+            if token is None:
+                continue
+            if token in tokenDict:
+                value = tokenDict[token]
+            elif defaults is not None:
+                value = defaults.get(token)
+            else:
+                value = None
+            if not value:
+                parts.append(TOKEN_START + token + TOKEN_END)
+                continue
+            if not isinstance(value, string_types):
+                value = str(value)
+            if TOKEN_START in value:
+                if token in _stack:
+                    raise ValueError("Cyclic token reference: "
+                        + " -> ".join(_stack + (token,)))
+                value = compile_template(value).render(
+                    tokenDict, defaults, _stack + (token,))
+            parts.append(value)
+        return "".join(parts)
+
+
+def parse(templateString):
+    """ Splits a template into a list of (literal, token) pairs. """
+    segments = []
+    start = 0
+    i = 0
+    length = len(templateString)
+    while True:
+        i = templateString.find(TOKEN_START, i, length)
+        if i < 0:
+            break
+        end = templateString.find(TOKEN_END, i, length)
+        if end < 0:
+            break
+        # Token names never contain the start character, use the innermost one
+        i = templateString.rfind(TOKEN_START, i, end)
+        segments.append((templateString[start:i], templateString[i+1:end]))
+        start = i = end + 1
+    segments.append((templateString[start:], None))
+    return segments
+
+
+def compile_template(templateString):
+    """ Returns the cached Template for the given string, compiling it if necessary. """
+    template = _TEMPLATE_CACHE.get(templateString)
+    if template is None:
+        if len(_TEMPLATE_CACHE) >= _TEMPLATE_CACHE_LIMIT:
+            _TEMPLATE_CACHE.clear()
+        template = Template(templateString)
+        _TEMPLATE_CACHE[templateString] = template
+    return template
+
+
+def find_tokens(templateString):
+    """ Returns a list of the tokens in a template. """
+    return list(compile_template(templateString).tokens)
+
+
+def to_path(formatedString):
+    """ Joins the "/" separated parts of a string with the os separator. """
+    pathList = formatedString.split("/")
+    if len(pathList) == 1:
+        return formatedString
+    # Keep the root of absolute and UNC paths, joining it would add or drop separators
+    root = ""
+    if not pathList[0]:
+        if len(pathList) > 2 and not pathList[1]:
+            root = os.sep * 2
+            pathList = pathList[2:]
+        else:
+            root = os.sep
+            pathList = pathList[1:]
+    return root + os.path.join(*pathList)
+
+
+class TemplateMatcher(object):
+    """Matches paths against a template and extracts the token values.
+
+    The path may continue below the template, the remainder is returned with the tokens.
+    """
+
+    def __init__(self, template, value=None):
+        self.template = template
+        self.value = value
+        self.prefix = ""
+        self.token_groups = []
+
+        pattern = ["^"]
+        group = 0
+        seen = dict()
+        segments = template.segments
+        for index, (literal, token) in enumerate(segments):
+            literal = normalize_path(literal)
+            if token is None:
+                literal = literal.rstrip("/")
+            if index == 0:
+                self.prefix = literal
+            pattern.append(re.escape(literal))
+            if token is None:
+                continue
+            if token in seen:
+                pattern.append("(?:\\%d)" % seen[token])
+            else:
+                group += 1
+                seen[token] = group
+                self.token_groups.append((token, group))
+                pattern.append("([^/]+)")
+        pattern.append("(?:/(.*))?$")
+        self.rest_group = group + 1
+        self.regex = re.compile("".join(pattern), re.IGNORECASE if CASE_INSENSITIVE else 0)
+
+    def match(self, path):
+        """ Returns a tuple of the token dictionary and the remaining path, or None if the 
+        normalized path doesn't match. 
+        """
+        match = self.regex.match(path)
+        if match is None:
+            return None
+        tokenDict = dict()
+        for token, group in self.token_groups:
+            tokenDict[token] = match.group(group)
+        return tokenDict, match.group(self.rest_group) or ""
+
+
+class PrefixTrie(object):
+    """A character trie of values keyed by their literal prefixes."""
+
+    def __init__(self):
+        self.root = ({}, [])
+
+    def insert(self, key, value):
+        node = self.root
+        for char in key:
+            node = node[0].setdefault(char, ({}, []))
+        node[1].append(value)
+
+    def find_prefixes(self, string):
+        """ Returns the values of every key that prefixes the string, longest key first. """
+        found = []
+        node = self.root
+        found.append(node[1])
+        for char in string:
+            node = node[0].get(char)
+            if node is None:
+                break
+            found.append(node[1])
+        values = []
+        for nodeValues in reversed(found):
+            values.extend(nodeValues)
+        return values
+
+
+class PathIndex(object):
+    """Resolves paths to the template that created them through a PrefixTrie of 
+    TemplateMatchers.
+    """
+
+    def __init__(self):
+        self.trie = PrefixTrie()
+
+    def add(self, template, value):
+        matcher = TemplateMatcher(template, value)
+        key = matcher.prefix.lower() if CASE_INSENSITIVE else matcher.prefix
+        self.trie.insert(key, matcher)
+
+    def match(self, path, accept=None):
+        """ Returns (value, tokenDict, rest) for the most specific template matching the path, 
+        or None. An optional accept function filters the candidate values.
+        """
+        path = normalize_path(path)
+        key = path.lower() if CASE_INSENSITIVE else path
+        best = None
+        for matcher in self.trie.find_prefixes(key):
+            if accept is not None and not accept(matcher.value):
+                continue
+            result = matcher.match(path)
+            if result is None:
+                continue
+            # Prefer the template that consumes the most of the path
+            if best is None or len(result[1]) < len(best[2]):
+                best = (matcher.value, result[0], result[1])
+                if not result[1]:
+                    break
+        return best
+
+
+def normalize_path(path):
+    """ Returns the path with "/" separators and no doubled separators. """
+    path = path.replace("\\", "/")
+    # Keep the leading double slash of UNC paths
+    unc = path.startswith("//")
+    while "//" in path:
+        path = path.replace("//", "/")
+    if unc:
+        path = "/" + path
+    return path
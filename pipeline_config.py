@@ -7,4 +7,12 @@ import os
 DEFAULT_JOBS_DIR = "V:\\Jobs"
 CONFIG_FILE_NAME = "config.yml"
 TEMP_FILE_SUFFIX = "_temp"
-LOCAL_CONFIG_PATH = os.path.expanduser('~/pipeline_local_config.yml')
\ No newline at end of file
+LOCAL_CONFIG_PATH = os.path.expanduser('~/pipeline_local_config.yml')
+LOCAL_CACHE_DIR = os.path.expanduser('~/.pipeline_cache')
+# Optional studio wide config that every job config is layered over
+STUDIO_CONFIG_PATH = os.environ.get('PIPELINE_STUDIO_CONFIG', '')
+# Hardlink the read only files of token template folders instead of copying them
+TEMPLATE_HARDLINK = False
+# Publish by writing the archive copy and hardlinking the publish copy to it when both are
+# on the same volume. Neither copy should be edited in place then
+PUBLISH_HARDLINK = False
\ No newline at end of file
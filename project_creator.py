@@ -2,28 +2,22 @@
 # Adam Thompson 2018
 
 import os
-import sys
-import config_reader
-import distutils.dir_util
+import dir_listing
+import template_manifest
 from shutil import copyfile
+from multiprocessing.pool import ThreadPool
+
+# Folders are created this many at a time, on a network share it's mostly latency
+CREATE_THREADS = 16
 
 def createProject(configReader, templateString, tokenDict, software, fileName):
     """ Creates the necessary folders and a project file. Returns the path to the file created. """
     # templateString = configReader.get_profile_template(software, profile)
     print(configReader.get_path(templateString, tokenDict))
-    tokenList = configReader.find_tokens(templateString)
-    # Remove "job_path" token because it isn't necessary
-    if "job_path" in tokenList:
-        tokenList.remove("job_path")
-
-    print(tokenList)
 
     # Create folders for each missing token
     # TODO: Better error handling
-    missingToken = ""
-    pathToMissingToken = ""
-    for token in tokenList:
-        createToken(configReader, templateString, tokenDict, token)
+    createTokens(configReader, templateString, [tokenDict])
 
     _, fileExtension = os.path.splitext(fileName)
     print("fileExtension = " + fileExtension)
@@ -43,6 +37,7 @@ def createProject(configReader, templateString, tokenDict, software, fileName):
     newFilePath = os.path.join(configReader.get_path(templateString, tokenDict), fileName)
     print("newFilePath = " + newFilePath)
     copyfile(pathToSoftwareFile, newFilePath)
+    dir_listing.invalidate(os.path.dirname(newFilePath))
 
     return newFilePath
 
@@ -56,9 +51,70 @@ def createToken(configReader, templateString, tokenDict, token, tokenValue=""):
         pathToMissingToken = pathToToken
         templateTokenFolder = os.path.join(os.path.dirname(pathToMissingToken),".[" + token + "]")
         print("template token folder: " + templateTokenFolder)
-        distutils.dir_util.copy_tree(templateTokenFolder, pathToMissingToken)
-
-
+        copyTokenFolder(templateTokenFolder, pathToMissingToken)
+
+def copyTokenFolder(templateTokenFolder, pathToToken):
+    """ Copies a template folder to a new token folder. """
+    template_manifest.copy_template(templateTokenFolder, pathToToken)
+    # Don't wait for the cached listing to expire before the new folder shows up
+    dir_listing.invalidate(os.path.dirname(pathToToken))
+
+def planTokens(configReader, templateString, tokenDicts):
+    """Returns a list with one list per token of the template, in order, of the (template 
+    folder, folder) tuples to create for every token dictionary. Folders shared by several 
+    dictionaries, such as a sequence holding many shots, are only planned once. Nothing is 
+    planned below a token a dictionary has no value for.
+    """
+    tokenDicts = [dict(tokenDict, job_path=configReader.job_path) for tokenDict in tokenDicts]
+    planned = set()
+    levels = []
+    for token in configReader.get_tokens(templateString):
+        tokenDicts = [tokenDict for tokenDict in tokenDicts if tokenDict.get(token)]
+        # One template resolve for the whole batch
+        parents = configReader.get_paths(templateString, tokenDicts, token)
+        level = []
+        for tokenDict, parent in zip(tokenDicts, parents):
+            pathToToken = os.path.normpath(os.path.join(parent, tokenDict[token]))
+            if pathToToken not in planned:
+                planned.add(pathToToken)
+                level.append((os.path.join(os.path.dirname(pathToToken), ".[" + token + "]"),
+                              pathToToken))
+        levels.append(level)
+    return levels
+
+def createTokens(configReader, templateString, tokenDicts, threads=CREATE_THREADS):
+    """Creates the token folders of many token dictionaries at once, such as the shots of 
+    a shot list, from their template folders. Folders are created a token at a time so 
+    parents exist before their children, and the folders of each token are created on 
+    a thread pool. Returns the list of folders created.
+    """
+    created = []
+    for level in planTokens(configReader, templateString, tokenDicts):
+        created.extend(path for path in mapTasks(createFolder, level, threads) if path)
+    return created
+
+def createFolder(task):
+    """ Copies a template folder to a folder that doesn't exist yet. Returns the folder, or 
+    None if it already existed.
+    """
+    templateTokenFolder, pathToToken = task
+    if os.path.isdir(pathToToken):
+        return None
+    copyTokenFolder(templateTokenFolder, pathToToken)
+    return pathToToken
+
+def mapTasks(function, tasks, threads=CREATE_THREADS):
+    """ Returns [function(task) for task in tasks], run on a thread pool if there are 
+    several tasks.
+    """
+    if len(tasks) <= 1:
+        return [function(task) for task in tasks]
+    pool = ThreadPool(min(threads, len(tasks)))
+    try:
+        return pool.map(function, tasks)
+    finally:
+        pool.close()
+        pool.join()
 
 
 # if __name__== '__main__':
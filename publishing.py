@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import hashlib
+
+import file_copy
+import versioning
+
+# Constants
+from pipeline_config import PUBLISH_HARDLINK
+
+ARCHIVE_DIR_NAME = 'archive'
+PUBLISH_DIR_NAME = 'publish'
+CHECKSUM_ALGORITHM = 'sha256'
+TRANSFER_CHUNK_SIZE = 4 * 1024 * 1024
+# Copies are written next to their destination under this suffix and renamed once complete
+PARTIAL_SUFFIX = '.partial'
+
+
+def get_archive_path(project_path):
+    """ Returns the path the project is archived to when it's published. """
+    proj_dir = os.path.dirname(project_path)
+    # Append 'PUBLISH' to file before archiving it
+    archive_name, ext = os.path.splitext(os.path.basename(project_path))
+    archive_name = versioning.remove_temp_suffix(archive_name)
+    archive_name = archive_name + '_PUBLISH' + ext
+    return os.path.join(proj_dir, ARCHIVE_DIR_NAME, archive_name)
+
+def get_publish_dir(project_path):
+    """ Returns the directory the project is published to. """
+    return os.path.join(os.path.dirname(project_path), PUBLISH_DIR_NAME)
+
+def make_dirs(directory):
+    """ Creates the directory and its parents if they don't exist. """
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+def publish_file(project_path, archive_path, publish_path, hardlink=PUBLISH_HARDLINK):
+    """Copies the project to the archive and publish paths, creating their directories, and
+    returns the project's checksum. The project is read once for both copies, see 
+    transfer_file. If hardlink is set and both directories are on the same volume only the 
+    archive is written and the publish path is a hardlink to it.
+    """
+    make_dirs(os.path.dirname(archive_path))
+    make_dirs(os.path.dirname(publish_path))
+
+    link = hardlink and is_same_volume(
+        os.path.dirname(archive_path), os.path.dirname(publish_path))
+    if link:
+        checksum = transfer_file(project_path, [archive_path])
+        link_file(archive_path, publish_path)
+    else:
+        checksum = transfer_file(project_path, [archive_path, publish_path])
+    return checksum
+
+def transfer_file(source, destinations, algorithm=CHECKSUM_ALGORITHM):
+    """Copies source to every destination and returns its checksum, reading it only once
+    for all of them. Where the file system shares blocks the copies are reflinks and the 
+    read is only for the checksum. A destination is only replaced once its copy is 
+    complete.
+    """
+    checksum = hashlib.new(algorithm)
+    partial_paths = [destination + PARTIAL_SUFFIX for destination in destinations]
+    try:
+        with open(source, 'rb') as src:
+            outputs = []
+            try:
+                for partial_path in partial_paths:
+                    # A stale partial can be a hardlink to a published file, writing through
+                    # it would truncate that file too
+                    if os.path.lexists(partial_path):
+                        os.remove(partial_path)
+                    outputs.append(open(partial_path, 'wb'))
+                # Kernel offload, reflinked copies need no writes
+                writers = [output for output in outputs 
+                           if not file_copy.clone_file(src, output)]
+                while True:
+                    chunk = src.read(TRANSFER_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    checksum.update(chunk)
+                    for output in writers:
+                        output.write(chunk)
+            finally:
+                for output in outputs:
+                    output.close()
+        for partial_path, destination in zip(partial_paths, destinations):
+            replace_file(partial_path, destination)
+    except:
+        for partial_path in partial_paths:
+            if os.path.isfile(partial_path):
+                os.remove(partial_path)
+        raise
+    return checksum.hexdigest()
+
+def link_file(source, destination):
+    """ Replaces destination with a hardlink to source, or with a copy if the file system
+    can't link them.
+    """
+    partial_path = destination + PARTIAL_SUFFIX
+    if os.path.isfile(partial_path):
+        os.remove(partial_path)
+    try:
+        os.link(source, partial_path)
+    except (OSError, AttributeError):
+        # The copy stays in the kernel where it can
+        file_copy.copy_file(source, partial_path)
+    replace_file(partial_path, destination)
+
+def replace_file(source, destination):
+    """ Renames source to destination, replacing it if it exists. """
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+        return
+    # Python 2 can't rename over an existing file on Windows
+    if os.name == 'nt' and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+def is_same_volume(path, other_path):
+    return os.stat(path).st_dev == os.stat(other_path).st_dev
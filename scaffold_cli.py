@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import re
+import sys
+import csv
+import time
+import argparse
+
+import navigator_cli
+import navigator_model
+import project_creator
+
+# Constants
+from pipeline_config import DEFAULT_JOBS_DIR
+
+# CMX 3600 event lines start with the event number and the reel name
+EDL_EVENT_REGEX = re.compile(r'^\s*\d+\s+(\S+)\s')
+EDL_CLIP_NAME_REGEX = re.compile(r'^\s*\*\s*FROM CLIP NAME:\s*(.+?)\s*$', re.IGNORECASE)
+# Black isn't a shot, and neither is an aux source without a clip name
+EDL_BLACK_REELS = ('BL', 'BLACK')
+EDL_AUX_REELS = ('AX',)
+
+
+def read_csv(path):
+    """ Returns a token dictionary for each row of a CSV file whose header row holds the
+    token names. Empty cells are left out.
+    """
+    with open(path) as stream:
+        return [dict((token.strip(), value.strip()) for token, value in row.items()
+                     if token and value and value.strip())
+                for row in csv.DictReader(stream)]
+
+def read_edl(path):
+    """ Returns the clip name of each event of a CMX 3600 EDL without its extension, in
+    order and without repeats. Events without a clip name use their reel name.
+    """
+    names = []
+    # (reel, clip name) of each event
+    events = []
+    with open(path) as stream:
+        for line in stream:
+            match = EDL_EVENT_REGEX.match(line)
+            if match:
+                events.append([match.group(1), None])
+                continue
+            match = EDL_CLIP_NAME_REGEX.match(line)
+            if match and events:
+                events[-1][1] = os.path.splitext(match.group(1))[0]
+    for reel, clipName in events:
+        if reel.upper() in EDL_BLACK_REELS:
+            continue
+        if clipName:
+            names.append(clipName)
+        elif reel.upper() not in EDL_AUX_REELS:
+            names.append(reel)
+    # Shots used by several events are created once
+    seen = set()
+    return [name for name in names if not (name in seen or seen.add(name))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Creates the token folders of many shots or assets at once from a CSV "
+                    "shot list or an EDL.")
+    parser.add_argument("software")
+    parser.add_argument("profile")
+    parser.add_argument("--jobs-dir", default=DEFAULT_JOBS_DIR)
+    parser.add_argument("--job", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="A CSV file with a header row of token names")
+    source.add_argument("--edl", help="An EDL whose clip names are the values of --edl-token")
+    parser.add_argument("--edl-token", default="shot")
+    parser.add_argument("-t", "--token", action="append", default=[], metavar="TOKEN=VALUE",
+                        dest="tokens", help="A value every row shares, can be given several "
+                                            "times")
+    parser.add_argument("--threads", type=int, default=project_creator.CREATE_THREADS)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the folders that would be created")
+    args = parser.parse_args(argv)
+
+    try:
+        sharedTokens = navigator_cli.parse_tokens(args.tokens)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.csv:
+        rows = read_csv(args.csv)
+    else:
+        rows = [{args.edl_token: name} for name in read_edl(args.edl)]
+    tokenDicts = [dict(sharedTokens, **row) for row in rows]
+
+    model = navigator_model.NavigatorModel(args.software, jobs_dir=args.jobs_dir)
+    try:
+        navigator_cli.check_selection(model, args.job, args.profile)
+    except ValueError as exc:
+        sys.stderr.write(str(exc) + "\n")
+        return 1
+    configReader = model.configReader
+    templateString = configReader.get_profile_template(args.software, args.profile)
+
+    if args.dry_run:
+        for level in project_creator.planTokens(configReader, templateString, tokenDicts):
+            for templateTokenFolder, pathToToken in level:
+                if not os.path.isdir(pathToToken):
+                    print(pathToToken)
+        return 0
+
+    start = time.time()
+    created = project_creator.createTokens(
+        configReader, templateString, tokenDicts, args.threads)
+    for path in created:
+        print(path)
+    print("Created %d folders for %d rows in %.2f s" % (
+        len(created), len(tokenDicts), time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
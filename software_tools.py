@@ -3,31 +3,26 @@
 
 import os
 import sys
-import re
-import importlib
-import imp
-import publisher
+
 import environment
+import publishing
+import versioning
 
 from pipeline_config import TEMP_FILE_SUFFIX
-
-from shutil import copyfile
-
-try:
-    # < Nuke 11
-    import PySide.QtCore as QtCore
-    import PySide.QtGui as QtGui
-    import PySide.QtGui as QtGuiWidgets
-    import PySide.QtUiTools as QtUiTools
-except:
-    # >= Nuke 11
-    import PySide2.QtCore as QtCore
-    import PySide2.QtGui as QtGui
-    import PySide2.QtWidgets as QtGuiWidgets
-    import PySide2.QtUiTools as QtUiTools
+from versioning import REG_VERSION_PATTERN
 
 
-REG_VERSION_PATTERN = r'(?<=(?i)_v)\d+'
+def get_qt_widgets():
+    """ Imports the Qt widgets module when a dialog is needed, so the tools can be 
+    imported where Qt isn't available.
+    """
+    try:
+        # < Nuke 11
+        import PySide.QtGui as QtGuiWidgets
+    except ImportError:
+        # >= Nuke 11
+        import PySide2.QtWidgets as QtGuiWidgets
+    return QtGuiWidgets
 
 
 class SoftwareTools(object):
@@ -38,87 +33,56 @@ class SoftwareTools(object):
 
     def increment_version(self, path):
         """ Attempts to increment all the instances of a version number in the provided path. """
-        try:
-            version = self.get_version_str(path)
-        except:
-            raise
-        increment_ver = str(int(version) + 1).zfill(len(version))
-        new_path = re.sub(REG_VERSION_PATTERN, increment_ver, path)
-
-        return new_path
+        return versioning.increment_version(path)
 
     def remove_temp_suffix(self, name):
         """ If the temporary file suffix exists, strip it and add the extension 
         back to the end. """
-        raw_name, ext = os.path.splitext(name)
-        if raw_name.endswith(TEMP_FILE_SUFFIX):
-            name = raw_name[:-len(TEMP_FILE_SUFFIX)] + ext
-        return name
+        return versioning.remove_temp_suffix(name)
 
     def create_pub_name(self, name):
         """ Takes the project name and replaces v### with 'PUBLISH' """
-        # If it's a temporary file, strip the suffix before renaming
-        name = self.remove_temp_suffix(name)
-        # Make a list of tuples for all instances of the reg_version_pattern
-        ver_index_list = [m.span() for m in re.finditer(REG_VERSION_PATTERN, name)]
-        if len(ver_index_list) < 1:
-            new_name, ext = os.path.splitext(name)
-            new_name = new_name + '_PUBLISH' + ext
-        elif len(ver_index_list) == 1:
-            first_index, last_index = ver_index_list[0]
-            # decrement first_index to account for 'v' in version
-            first_index = first_index-1
-            new_name = name[:first_index] + 'PUBLISH' + name[last_index:]
-        else:
-            raise ValueError("More or less than one instance of v### in file name.")
-
-        return new_name
+        return versioning.create_pub_name(name)
 
     def get_version_str(self, path, padded=True):
         """ Attemps to return the version number of the path as a string. 
         By default it is padded in its original format. 
         """
-        # Find all instances of v###*
-        reg_pattern = r'(?<=_v)\d+'
-        ver_list = re.findall(REG_VERSION_PATTERN, path)
-
-        # Check that there are no conflicting versions in the path
-        if all(x == ver_list[0] for x in ver_list) and len(ver_list) > 0:
-            version = ver_list[0]
-            if padded:
-                return version
-            else:
-                return version.lstrip('0')
-        else:
-            raise ValueError(
-                "There are conflicting version numbers in this path or none at all: " + path)
+        return versioning.get_version_str(path, padded)
 
     def get_version_int(self, path):
         """ Returns the version of the given path as an integer. """
-        try:
-            return int(self.get_version_str(path))
-        except:
-            raise
+        return versioning.get_version_int(path)
 
     def find_env_file(self, path, env_file_name):
         """ Looks in each directory level of "path" for the env_file_name.
         If it finds it, it returns the path to the file """
-        current_dir = path
-        while current_dir:
-            env_file_path = os.path.join(current_dir, env_file_name)
-            if os.path.isfile(env_file_path):
-                return env_file_path
-            current_dir, check_folder = os.path.split(current_dir)
-            # If there are no more directories, break
-            if not check_folder:
-                break
-        return ''
+        return versioning.find_env_file(path, env_file_name)
+
+    def recover_environment(self, path=None):
+        """ If the current environment isn't valid, attempts to set it from the location of 
+        the given path, or the current project. Returns true if the environment is valid.
+        """
+        if environment.is_valid(software=self.get_software()):
+            return True
+        if not path:
+            path = self.get_project_path()
+        if not path:
+            return False
+        context = environment.set_environment_from_path(path, self.get_software())
+        if context is None:
+            return False
+        config_reader, software, profile, token_dict = context
+        self.set_environment(
+            config_reader, config_reader.get_profile_template(software, profile), token_dict)
+        return True
 
     def version_up(self, only_filename=False):
         """ Given a path this will version up the file and return the incremented path if the 
         file doesn't already exist, or if the user chooses to overwrite the existing file. 
         """
         path = self.get_project_path()
+        self.recover_environment(path)
         directory = os.path.dirname(path)
         if only_filename:
             path = os.path.basename(path)
@@ -143,6 +107,7 @@ class SoftwareTools(object):
         if it can be replaced. 
         """
         if os.path.isfile(path):
+            QtGuiWidgets = get_qt_widgets()
             # Create dialog
             ok_button = QtGuiWidgets.QMessageBox.Ok
             cancel_button = QtGuiWidgets.QMessageBox.Cancel
@@ -167,6 +132,7 @@ class SoftwareTools(object):
         """ Open this dialog if the file has unsaved changes.
         Returns true or false if the user wants to save. 
         """
+        QtGuiWidgets = get_qt_widgets()
         save_button = QtGuiWidgets.QMessageBox.Save
         cancel_button = QtGuiWidgets.QMessageBox.Cancel
 
@@ -188,8 +154,8 @@ class SoftwareTools(object):
         """ Publishes the current file base on the file name and location. """
         if not project_path:
             project_path = self.get_project_path()
-        # Check that the environment is valid
-        if environment.is_valid(software=self.get_software()):
+        # Check that the environment is valid, or can be recovered from the project's location
+        if self.recover_environment(project_path):
             # Check if the file has been modified
             if self.is_project_modified():
                 if self.file_not_saved_dlg():
@@ -198,40 +164,25 @@ class SoftwareTools(object):
                     return False
             
             # Define directories
-            proj_dir = os.path.dirname(project_path)
             raw_proj_name, proj_ext = os.path.splitext(os.path.basename(project_path))
             self.debug_msg("project basename = " + os.path.basename(project_path))
-            archive_dir = os.path.join(proj_dir, 'archive')
-            publish_dir = os.path.join(proj_dir, 'publish')
-
-            # Append 'PUBLISH' to file before archiving it
-            archive_name, ext = os.path.splitext(os.path.basename(project_path))
-            archive_name = self.remove_temp_suffix(archive_name)
-            archive_name = archive_name + '_PUBLISH' + ext
+            archive_path = publishing.get_archive_path(project_path)
+            publish_dir = publishing.get_publish_dir(project_path)
 
             # Create publish name
             pub_name = self.create_pub_name(os.path.basename(project_path))
 
+            # The dialog needs Qt, only load it when publishing interactively
+            import publisher
             publisher_dlg = publisher.Publisher(publish_dir, pub_name)
             if publisher_dlg.exec_():
                 pub_name = publisher_dlg.get_name()
                 # If a valid name comes back from the dialog, copy it to the publish directory
                 if pub_name:
-                    # Create archive directory if it doesn't exist
-                    try:
-                        os.makedirs(archive_dir)
-                    except OSError:
-                        if not os.path.isdir(archive_dir):
-                            raise
-                    copyfile(project_path, os.path.join(archive_dir, archive_name))
-
-                    # Create publish folder if it doesn't exist
-                    try:
-                        os.makedirs(publish_dir)
-                    except OSError:
-                        if not os.path.isdir(publish_dir):
-                            raise
-                    copyfile(project_path, os.path.join(publish_dir, pub_name))
+                    checksum = publishing.publish_file(
+                        project_path, archive_path, os.path.join(publish_dir, pub_name))
+                    self.debug_msg("Published " + pub_name + ", " 
+                        + publishing.CHECKSUM_ALGORITHM + " " + checksum)
 
                     if publisher_dlg.get_del_state():
                         if raw_proj_name.endswith(TEMP_FILE_SUFFIX):
@@ -277,7 +228,7 @@ class SoftwareTools(object):
 # DEBUGGING------------------------------------------------------------------------------------------------------------------
 if __name__ == '__main__':
     path = 'V:/Jobs/182276_Essilor_Out_of_Focus/Design/Production/TVC60/Assets/Environments/Gym/model/esof_gym_model_V05.ma'
-    app = QtGuiWidgets.QApplication(sys.argv)
+    app = get_qt_widgets().QApplication(sys.argv)
     # print(SoftwareTools().version_up(path))
     print("Here it is! " + SoftwareTools().find_env_file(
         'V:\\Jobs\\182350_Lululemon\\Design\\Production\\tvc_20_1920\\Previz\\Projects\\CG\\layout', 'workspaces.mel'))
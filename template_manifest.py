@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import dir_listing
+import file_copy
+
+# Constants
+from pipeline_config import TEMPLATE_HARDLINK
+
+# Template folders whose manifests are kept, and the seconds a manifest is trusted before
+# the mtimes of its folders are checked again
+MANIFEST_CACHE_SIZE = 256
+MANIFEST_TTL = 5.0
+
+_MANIFESTS = OrderedDict()
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(path):
+    """ Returns the TemplateManifest of a template folder, the cached one while none of its
+    folders changed. Raises OSError if the folder doesn't exist.
+    """
+    path = os.path.normpath(path)
+    now = time.time()
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.pop(path, None)
+    if manifest is None or (now - manifest.checked >= MANIFEST_TTL
+                            and not manifest.is_current()):
+        manifest = TemplateManifest(path)
+    manifest.checked = now
+    with _MANIFESTS_LOCK:
+        _MANIFESTS[path] = manifest
+        while len(_MANIFESTS) > MANIFEST_CACHE_SIZE:
+            _MANIFESTS.popitem(last=False)
+    return manifest
+
+def copy_template(source, destination, hardlink=TEMPLATE_HARDLINK):
+    """ Creates destination as a copy of the template folder source, see
+    file_copy.copy_file for how files are copied. Returns the manifest of the template.
+    """
+    manifest = get_manifest(source)
+    if not os.path.isdir(destination):
+        os.makedirs(destination)
+    for directory in manifest.dirs:
+        path = os.path.join(destination, directory)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    for name, size in manifest.files:
+        file_copy.copy_file(
+            os.path.join(source, name), os.path.join(destination, name), hardlink)
+    return manifest
+
+
+class TemplateManifest(object):
+    """The folders and files of a template folder, listed once so instantiating it many
+    times, as when creating hundreds of shots, doesn't walk it every time.
+
+    dirs are the relative paths of the sub folders, parents first, and files are tuples of
+    relative path and size. The manifest stays current while the mtimes of its folders
+    don't change, which covers files being added, removed or renamed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dirs = []
+        self.files = []
+        # relative folder path -> mtime, the template folder itself is ""
+        self.dir_mtimes = dict()
+        self.checked = 0
+        self.scan("")
+
+    def scan(self, relative):
+        path = os.path.join(self.path, relative)
+        self.dir_mtimes[relative] = os.stat(path).st_mtime
+        for entry in sorted(dir_listing.list_dir(path), key=lambda entry: entry.name):
+            name = os.path.join(relative, entry.name)
+            if entry.is_dir:
+                self.dirs.append(name)
+                self.scan(name)
+            else:
+                try:
+                    self.files.append((name, os.stat(entry.path).st_size))
+                except OSError:
+                    # Broken links can't be copied
+                    continue
+
+    def is_current(self):
+        """ Returns true if none of the template's folders changed since it was listed. """
+        try:
+            return all(os.stat(os.path.join(self.path, relative)).st_mtime == mtime
+                       for relative, mtime in self.dir_mtimes.items())
+        except OSError:
+            return False
+
+    def get_size(self):
+        """ Returns the total size of the template's files. """
+        return sum(size for _, size in self.files)
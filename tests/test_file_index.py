@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import sys
+import shutil
+import ntpath
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dir_listing
+import file_index
+import path_template
+
+
+class SplitTemplateTest(unittest.TestCase):
+
+    def split(self, source):
+        return file_index.split_template(path_template.Template(source))
+
+    def test_drive_letter(self):
+        root, components = self.split("V:\\Jobs\\job\\Production\\<spot>\\<shot>/nuke")
+        self.assertEqual(root, "V:\\Jobs\\job\\Production")
+        self.assertEqual(components, ["<spot>", "<shot>", "nuke"])
+        self.assertEqual(ntpath.join(root, "s1"), "V:\\Jobs\\job\\Production\\s1")
+
+    def test_drive_root(self):
+        root, components = self.split("V:\\<job>/shots")
+        self.assertEqual(root, "V:\\")
+        self.assertEqual(components, ["<job>", "shots"])
+        self.assertEqual(ntpath.join(root, "job"), "V:\\job")
+
+    def test_unc(self):
+        root, components = self.split("\\\\server\\share\\<job>\\<shot>")
+        self.assertEqual(root, "\\\\server\\share")
+        self.assertEqual(components, ["<job>", "<shot>"])
+
+    def test_posix(self):
+        self.assertEqual(self.split("/jobs/job/<spot>_<shot>/nuke"),
+                         ("/jobs/job", ["<spot>_<shot>", "nuke"]))
+        self.assertEqual(self.split("/<job>"), ("/", ["<job>"]))
+
+    def test_token_inside_component(self):
+        root, components = self.split("/jobs/shot_<shot>/nuke")
+        self.assertEqual(root, "/jobs")
+        self.assertEqual(components, ["shot_<shot>", "nuke"])
+
+    def test_no_tokens(self):
+        self.assertEqual(self.split("/jobs/job/assets"), ("/jobs/job/assets", []))
+
+
+class UpdateFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.job_path = tempfile.mkdtemp()
+        self.index = file_index.FileIndex(
+            self.job_path, os.path.join(self.job_path, "index.sqlite"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.job_path)
+
+    def update(self, *files):
+        path = os.path.join(self.job_path, "nuke")
+        entries = [dir_listing.DirEntry(name, os.path.join(path, name), False, mtime)
+                   for name, mtime in files]
+        self.index.update_files(path, entries, ("nuke", "shots"), {"shot": "sh010"})
+        return [(result['name'], result['mtime']) for result in self.index.search("sh010")]
+
+    def test_overwritten_file_is_newest(self):
+        self.assertEqual(self.update(("sh010_v001.nk", 100), ("sh010_v002.nk", 200)),
+                         [("sh010_v002.nk", 200), ("sh010_v001.nk", 100)])
+        self.assertEqual(self.update(("sh010_v001.nk", 300), ("sh010_v002.nk", 200)),
+                         [("sh010_v001.nk", 300), ("sh010_v002.nk", 200)])
+
+    def test_removed_file(self):
+        self.update(("sh010_v001.nk", 100), ("sh010_v002.nk", 200))
+        self.assertEqual(self.update(("sh010_v002.nk", 200)), [("sh010_v002.nk", 200)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import sys
+import ntpath
+import posixpath
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import path_template
+
+
+class FakeOs(object):
+    """ Stands in for the os module so to_path joins with another platform's rules. """
+
+    def __init__(self, path):
+        self.sep = path.sep
+        self.path = path
+
+
+class ToPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.os = path_template.os
+
+    def tearDown(self):
+        path_template.os = self.os
+
+    def to_path(self, path, module):
+        path_template.os = FakeOs(module)
+        return path_template.to_path(path)
+
+    def test_ntpath(self):
+        self.assertEqual(self.to_path("//server/share/job/shots", ntpath),
+                         "\\\\server\\share\\job\\shots")
+        self.assertEqual(self.to_path("/jobs/job", ntpath), "\\jobs\\job")
+        self.assertEqual(self.to_path("V:\\Jobs\\job/shots/sh010", ntpath),
+                         "V:\\Jobs\\job\\shots\\sh010")
+        self.assertEqual(self.to_path("shots/sh010", ntpath), "shots\\sh010")
+
+    def test_posixpath(self):
+        self.assertEqual(self.to_path("//server/share/job", posixpath), "//server/share/job")
+        self.assertEqual(self.to_path("/jobs/job/", posixpath), "/jobs/job/")
+        self.assertEqual(self.to_path("/", posixpath), "/")
+        self.assertEqual(self.to_path("job", posixpath), "job")
+
+
+if __name__ == '__main__':
+    unittest.main()
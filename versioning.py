@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Adam Thompson 2018
+
+import os
+import re
+
+from pipeline_config import TEMP_FILE_SUFFIX
+
+# Matches the digits of every "_v###" in a path
+REG_VERSION_PATTERN = r'(?i)(?<=_v)\d+'
+VERSION_REGEX = re.compile(REG_VERSION_PATTERN)
+
+
+def increment_version(path):
+    """ Attempts to increment all the instances of a version number in the provided path. """
+    version = get_version_str(path)
+    increment_ver = str(int(version) + 1).zfill(len(version))
+    return VERSION_REGEX.sub(increment_ver, path)
+
+def remove_temp_suffix(name):
+    """ If the temporary file suffix exists, strip it and add the extension 
+    back to the end. """
+    raw_name, ext = os.path.splitext(name)
+    if raw_name.endswith(TEMP_FILE_SUFFIX):
+        name = raw_name[:-len(TEMP_FILE_SUFFIX)] + ext
+    return name
+
+def create_pub_name(name):
+    """ Takes the project name and replaces v### with 'PUBLISH' """
+    # If it's a temporary file, strip the suffix before renaming
+    name = remove_temp_suffix(name)
+    # Make a list of tuples for all instances of the version pattern
+    ver_index_list = [m.span() for m in VERSION_REGEX.finditer(name)]
+    if len(ver_index_list) < 1:
+        new_name, ext = os.path.splitext(name)
+        new_name = new_name + '_PUBLISH' + ext
+    elif len(ver_index_list) == 1:
+        first_index, last_index = ver_index_list[0]
+        # decrement first_index to account for 'v' in version
+        first_index = first_index-1
+        new_name = name[:first_index] + 'PUBLISH' + name[last_index:]
+    else:
+        raise ValueError("More or less than one instance of v### in file name.")
+
+    return new_name
+
+def get_version_str(path, padded=True):
+    """ Attemps to return the version number of the path as a string. 
+    By default it is padded in its original format. 
+    """
+    ver_list = VERSION_REGEX.findall(path)
+
+    # Check that there are no conflicting versions in the path
+    if len(ver_list) > 0 and all(x == ver_list[0] for x in ver_list):
+        version = ver_list[0]
+        if padded:
+            return version
+        else:
+            return version.lstrip('0')
+    else:
+        raise ValueError(
+            "There are conflicting version numbers in this path or none at all: " + path)
+
+def get_version_int(path):
+    """ Returns the version of the given path as an integer. """
+    return int(get_version_str(path))
+
+def split_version(name):
+    """ Returns a tuple of the name with its version digits removed and the version as an 
+    integer, or None if the name has no version or conflicting versions. 
+    """
+    parts = []
+    start = 0
+    version = None
+    for match in VERSION_REGEX.finditer(name):
+        if version is not None and match.group() != version:
+            return None
+        version = match.group()
+        parts.append(name[start:match.start()])
+        start = match.end()
+    if version is None:
+        return None
+    parts.append(name[start:])
+    return "".join(parts), int(version)
+
+def find_env_file(path, env_file_name):
+    """ Looks in each directory level of "path" for the env_file_name.
+    If it finds it, it returns the path to the file """
+    current_dir = path
+    while current_dir:
+        env_file_path = os.path.join(current_dir, env_file_name)
+        if os.path.isfile(env_file_path):
+            return env_file_path
+        current_dir, check_folder = os.path.split(current_dir)
+        # If there are no more directories, break
+        if not check_folder:
+            break
+    return ''